@@ -0,0 +1,183 @@
+import random
+import zlib
+from collections import Counter, deque
+
+from simulation import Direction, Occupancy, OPPOSITE
+
+
+# Multiplayer rules: many player snakes on one fixed board, all moving once
+# per tick. Like Simulation this is headless and seeded. Each step() records
+# what changed as deltas, so a server can send those instead of the board:
+#
+#   (JOIN, id, name)      (LEAVE, id)
+#   (SPAWN, id, pos, direction)
+#   (MOVE, id, direction) head advances one cell; eats if it lands on food
+#   (TAIL, id)            tail cell leaves the board
+#   (DIE, id)             whole body leaves the board
+#   (FOOD, pos)           food appears
+#   (WALL, pos)           wall appears
+#
+# Deltas are in the order they must be applied. By the rules every tail
+# leaves before any head moves, so snakes may follow tails, their own or
+# other players'; two heads entering the same cell both die. The TAIL deltas
+# are still sent after the MOVEs, so a one-cell snake always has a head to
+# move from.
+
+ARENA_WIDTH = 120
+ARENA_HEIGHT = 120
+RESPAWN_TICKS = 20
+FOOD_MIN = 4
+WALL_EVERY = 10  # a wall appears each time this much food has been eaten
+
+JOIN, LEAVE, SPAWN, MOVE, TAIL, DIE, FOOD, WALL = range(8)
+
+DIRECTIONS = list(Direction)
+
+
+class ArenaSnake:
+    def __init__(self, player_id, name):
+        self.id = player_id
+        self.name = name
+        self.body = deque()
+        self.direction = Direction.RIGHT
+        self.next_direction = Direction.RIGHT
+        self.score = 0
+        self.alive = False
+        self.respawn_tick = 0
+
+
+class ArenaSimulation:
+    def __init__(self, width=ARENA_WIDTH, height=ARENA_HEIGHT, seed=None):
+        self.width = width
+        self.height = height
+        self.rng = random.Random(seed)
+        self.board = Occupancy(width, height)
+        self.snakes = {}
+        self.food = set()
+        self.walls = []
+        self.tick = 0
+        self.eaten = 0
+        self.next_id = 1
+        self.deltas = []
+
+    def drain_deltas(self):
+        deltas = self.deltas
+        self.deltas = []
+        return deltas
+
+    def join(self, name):
+        snake = ArenaSnake(self.next_id, name)
+        self.next_id += 1
+        self.snakes[snake.id] = snake
+        self.deltas.append((JOIN, snake.id, name))
+        self.spawn(snake)
+        return snake.id
+
+    def leave(self, player_id):
+        snake = self.snakes.pop(player_id, None)
+        if snake is None:
+            return
+        for pos in snake.body:
+            self.board.remove(Occupancy.SNAKE, pos)
+        self.deltas.append((LEAVE, player_id))
+
+    def set_direction(self, player_id, direction):
+        snake = self.snakes.get(player_id)
+        if snake and direction != OPPOSITE[snake.direction]:
+            snake.next_direction = direction
+
+    def free_cell(self):
+        # Food isn't on the occupancy grid, so retry the odd pick that lands on it
+        for _ in range(8):
+            pos = self.board.random_free_cell(self.rng)
+            if pos is None or pos not in self.food:
+                return pos
+        return None
+
+    def spawn(self, snake):
+        pos = self.free_cell()
+        if pos is None:
+            # Board is full: try again later
+            snake.respawn_tick = self.tick + RESPAWN_TICKS
+            return
+        # Face a free neighbour when there is one
+        options = [d for d in DIRECTIONS if not self.board.is_blocked((pos[0] + d.value[0], pos[1] + d.value[1]))]
+        direction = self.rng.choice(options or DIRECTIONS)
+        snake.body = deque([pos])
+        snake.direction = snake.next_direction = direction
+        snake.alive = True
+        snake.score = 0
+        self.board.add(Occupancy.SNAKE, pos)
+        self.deltas.append((SPAWN, snake.id, pos, direction))
+
+    def step(self):
+        self.tick += 1
+        board = self.board
+        moving = [snake for snake in self.snakes.values() if snake.alive]
+        heads = {}
+        for snake in moving:
+            snake.direction = snake.next_direction
+            dx, dy = snake.direction.value
+            x, y = snake.body[0]
+            heads[snake.id] = (x + dx, y + dy)
+
+        # Tails first, so following a tail is safe
+        tails = []
+        for snake in moving:
+            if heads[snake.id] not in self.food:
+                board.remove(Occupancy.SNAKE, snake.body.pop())
+                tails.append((TAIL, snake.id))
+
+        targets = Counter(heads.values())
+        dead = []
+        for snake in moving:
+            head = heads[snake.id]
+            if (not board.in_bounds(head) or board.has(Occupancy.WALL, head) or
+                    board.has(Occupancy.SNAKE, head) or targets[head] > 1):
+                dead.append(snake)
+                continue
+            # An empty body means a one-cell snake that just lost its tail
+            snake.body.appendleft(head)
+            board.add(Occupancy.SNAKE, head)
+            self.deltas.append((MOVE, snake.id, snake.direction))
+            if head in self.food:
+                self.food.remove(head)
+                snake.score += 1
+                self.eaten += 1
+                if self.eaten % WALL_EVERY == 0:
+                    self.add_wall()
+        self.deltas.extend(tails)
+
+        for snake in dead:
+            for pos in snake.body:
+                board.remove(Occupancy.SNAKE, pos)
+            snake.body.clear()
+            snake.alive = False
+            snake.respawn_tick = self.tick + RESPAWN_TICKS
+            self.deltas.append((DIE, snake.id))
+
+        for snake in self.snakes.values():
+            if not snake.alive and self.tick >= snake.respawn_tick:
+                self.spawn(snake)
+
+        target = FOOD_MIN + len(self.snakes) // 2
+        while len(self.food) < target:
+            pos = self.free_cell()
+            if pos is None:
+                break
+            self.food.add(pos)
+            self.deltas.append((FOOD, pos))
+
+    def add_wall(self):
+        pos = self.free_cell()
+        if pos is not None:
+            self.walls.append(pos)
+            self.board.add(Occupancy.WALL, pos)
+            self.deltas.append((WALL, pos))
+
+
+def arena_checksum(snakes, food, walls):
+    # snakes: {id: body cells head first}; shared by server and client mirrors
+    state = (sorted((player_id, tuple(body)) for player_id, body in snakes.items()),
+             sorted(food), len(walls))
+    return zlib.crc32(repr(state).encode())
@@ -0,0 +1,284 @@
+import heapq
+from collections import deque
+
+from simulation import Direction, LAYOUT_HEIGHT, LAYOUT_WIDTH, Occupancy, OPPOSITE
+
+
+# Autopilot for the player snake. Each tick it plans an A* path to the food
+# that treats body cells as passable once the tail will have left them, then
+# only takes that path if the tail is still reachable afterwards. Otherwise it
+# follows a Hamiltonian cycle of the board while that keeps the tail
+# reachable, or failing that the move that keeps the most room. Checking
+# only the next move's tail reachability is a best effort: the snake can
+# still trap itself when every move loses the tail, or be cut off by
+# obstacle snakes. Works as an evaluate.py controller: call it with the
+# simulation and it returns the Direction to steer.
+#
+# Every search stays inside a WINDOW_WIDTH x WINDOW_HEIGHT window around the
+# head, so a decision costs the same on any board size. The window covers
+# every growing board; on bigger fixed boards food outside it is approached
+# through the window cell nearest to it, and a flood fill that reaches the
+# window's edge counts as reaching the tail.
+
+DIRECTIONS = list(Direction)
+INF = float('inf')
+WINDOW_WIDTH = LAYOUT_WIDTH
+WINDOW_HEIGHT = LAYOUT_HEIGHT
+
+
+def hamiltonian_cycle(width, height):
+    # Cycle through every cell for boards with an even side: along row 0, then
+    # zig-zag the remaining rows over columns 1.., and back up column 0.
+    # Returns {cell: next cell} or None when both sides are odd.
+    if height % 2 == 0:
+        order = [(x, 0) for x in range(width)]
+        for y in range(1, height):
+            xs = range(width - 1, 0, -1) if y % 2 else range(1, width)
+            order.extend((x, y) for x in xs)
+        order.extend((0, y) for y in range(height - 1, 0, -1))
+    elif width % 2 == 0:
+        # Same construction on the transposed board
+        transposed = hamiltonian_cycle(height, width)
+        return {(y, x): (ny, nx) for (x, y), (nx, ny) in transposed.items()}
+    else:
+        return None
+    return dict(zip(order, order[1:] + order[:1]))
+
+
+class Window:
+    # Cells from (x0, y0) up to but not including (x1, y1)
+    def __init__(self, x0, y0, x1, y1):
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+
+    @classmethod
+    def around(cls, sim, pos):
+        # The search window with pos as near its middle as the board allows
+        width, height = min(sim.grid_width, WINDOW_WIDTH), min(sim.grid_height, WINDOW_HEIGHT)
+        x0 = min(max(0, pos[0] - width // 2), sim.grid_width - width)
+        y0 = min(max(0, pos[1] - height // 2), sim.grid_height - height)
+        return cls(x0, y0, x0 + width, y0 + height)
+
+    def key(self):
+        return self.x0, self.y0, self.x1, self.y1
+
+    def contains(self, pos):
+        return self.x0 <= pos[0] < self.x1 and self.y0 <= pos[1] < self.y1
+
+    def on_edge(self, pos, sim):
+        # On a side of the window with more board beyond it
+        x, y = pos
+        return ((x == self.x0 and x > 0) or (x == self.x1 - 1 and x < sim.grid_width - 1) or
+                (y == self.y0 and y > 0) or (y == self.y1 - 1 and y < sim.grid_height - 1))
+
+    def nearest_open(self, sim, target):
+        # target itself when inside, else the open edge cell nearest to it
+        if self.contains(target):
+            return target
+        tx, ty = target
+        edge = [(x, y) for x in range(self.x0, self.x1) for y in (self.y0, self.y1 - 1)]
+        edge += [(x, y) for y in range(self.y0, self.y1) for x in (self.x0, self.x1 - 1)]
+        edge = [pos for pos in edge if not sim.board.has(Occupancy.WALL, pos)]
+        return min(edge, key=lambda pos: abs(pos[0] - tx) + abs(pos[1] - ty), default=None)
+
+
+class DistanceField:
+    # BFS distances to the goal over the static board (bounds and walls only)
+    # inside the search window. It is an exact lower bound on the real path
+    # length there, so it serves as the A* heuristic; it is rebuilt only when
+    # the goal or the window moves or the walls change, which on boards the
+    # window covers happens when the food moves or on a level up.
+    def __init__(self):
+        self.key = None
+        self.dist = {}
+
+    def update(self, sim, goal, window):
+        key = (goal, window.key(), sim.level, len(sim.walls), sim.grid_width, sim.grid_height)
+        if key == self.key:
+            return
+        self.key = key
+        board = sim.board
+        dist = {goal: 0}
+        queue = deque([goal])
+        while queue:
+            x, y = queue.popleft()
+            d = dist[(x, y)] + 1
+            for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+                pos = (x + dx, y + dy)
+                if pos in dist or not window.contains(pos) or board.has(Occupancy.WALL, pos):
+                    continue
+                dist[pos] = d
+                queue.append(pos)
+        self.dist = dist
+
+    def get(self, pos):
+        return self.dist.get(pos, INF)
+
+
+class Autopilot:
+    def __init__(self, max_expansions=None):
+        self.max_expansions = max_expansions
+        self.field = DistanceField()
+        self.cycle = None
+        self.cycle_size = None
+        # Tick at which each body cell was entered by the head. Body segments
+        # are always the last len(snake) head positions, so a segment entered
+        # at tick e leaves the board len(snake) - (tick - e) moves from now.
+        self.entered = {}
+        self.last_tick = None
+        self.window = None
+
+    def __call__(self, sim):
+        return self.choose(sim)
+
+    def sync(self, sim):
+        if self.last_tick is not None and sim.tick == self.last_tick + 1:
+            self.entered[sim.snake[0]] = sim.tick
+        elif sim.tick != self.last_tick:
+            # New game, seek or skipped ticks: rebuild from the body
+            self.entered = {pos: sim.tick - k for k, pos in enumerate(sim.snake)}
+        self.last_tick = sim.tick
+        self.window = Window.around(sim, sim.snake[0])
+        if self.cycle_size != (sim.grid_width, sim.grid_height):
+            self.cycle_size = (sim.grid_width, sim.grid_height)
+            # Going round a board bigger than the window takes too long to help
+            fits = sim.grid_width <= WINDOW_WIDTH and sim.grid_height <= WINDOW_HEIGHT
+            self.cycle = hamiltonian_cycle(sim.grid_width, sim.grid_height) if fits else None
+
+    def danger(self, sim):
+        # Obstacle snakes and every cell they could step into next
+        cells = set()
+        for obs in sim.obstacle_snakes:
+            for x, y in obs.body:
+                cells.add((x, y))
+                if (x, y) == obs.body[0]:
+                    cells.update(((x, y - 1), (x, y + 1), (x - 1, y), (x + 1, y)))
+        return cells
+
+    def passable(self, sim, pos, step, danger):
+        # Can the head be on pos after `step` moves?
+        board = sim.board
+        if not self.window.contains(pos) or board.has(Occupancy.WALL, pos):
+            return False
+        if step <= 2 and pos in danger:
+            return False
+        if board.has(Occupancy.SNAKE, pos):
+            # The tail leaves only after the head has moved, so the cell must
+            # already be empty before this step
+            leaves_in = len(sim.snake) - (sim.tick - self.entered.get(pos, sim.tick))
+            return step > leaves_in
+        return True
+
+    def astar(self, sim, goal, danger):
+        start = sim.snake[0]
+        window = self.window
+        limit = self.max_expansions or 4 * (window.x1 - window.x0) * (window.y1 - window.y0)
+        best = {start: 0}
+        parent = {start: None}
+        heap = [(self.field.get(start), 0, start)]
+        expansions = 0
+        while heap and expansions < limit:
+            _, g, pos = heapq.heappop(heap)
+            if pos == goal:
+                path = []
+                while pos != start:
+                    path.append(pos)
+                    pos = parent[pos]
+                path.reverse()
+                return path
+            if g > best.get(pos, INF):
+                continue
+            expansions += 1
+            x, y = pos
+            for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+                nxt = (x + dx, y + dy)
+                if g + 1 >= best.get(nxt, INF) or not self.passable(sim, nxt, g + 1, danger):
+                    continue
+                if g == 0 and (dx, dy) == OPPOSITE[sim.direction].value:
+                    # A one-cell snake can't reverse either
+                    continue
+                h = self.field.get(nxt)
+                if h == INF:
+                    continue
+                best[nxt] = g + 1
+                parent[nxt] = pos
+                heapq.heappush(heap, (g + 1 + h, g + 1, nxt))
+        return None
+
+    def reachable(self, sim, start, blocked, target=None):
+        # Flood fill from start within the window; returns (cells reached,
+        # whether target is adjacent to the filled region or it spills out of
+        # the window into the rest of the board)
+        board = sim.board
+        window = self.window
+        seen = {start}
+        found = window.on_edge(start, sim)
+        queue = deque([start])
+        while queue:
+            x, y = queue.popleft()
+            for dx, dy in ((0, -1), (0, 1), (-1, 0), (1, 0)):
+                pos = (x + dx, y + dy)
+                if pos == target:
+                    found = True
+                if (pos in seen or pos in blocked or not window.contains(pos) or
+                        board.has(Occupancy.WALL, pos)):
+                    continue
+                seen.add(pos)
+                if not found and window.on_edge(pos, sim):
+                    found = True
+                queue.append(pos)
+        return len(seen), found
+
+    def safe_after(self, sim, path, danger, eats=True):
+        # Follow the path (eating at the end, if eats) and check the tail is
+        # still reachable
+        body = list(reversed(path)) + sim.snake
+        body = body[:len(sim.snake) + eats]
+        if len(body) < 2:
+            return True
+        tail = body[-1]
+        blocked = set(body[:-1]) | danger
+        return self.reachable(sim, body[0], blocked, target=tail)[1]
+
+    def step_to(self, sim, pos):
+        head = sim.snake[0]
+        for direction in DIRECTIONS:
+            dx, dy = direction.value
+            if (head[0] + dx, head[1] + dy) == pos:
+                return direction
+        return None
+
+    def choose(self, sim):
+        self.sync(sim)
+        danger = self.danger(sim)
+        goal = self.window.nearest_open(sim, sim.food.pos) if sim.food else None
+        if goal:
+            self.field.update(sim, goal, self.window)
+            path = self.astar(sim, goal, danger)
+            if path and self.safe_after(sim, path, danger):
+                return self.step_to(sim, path[0])
+
+        head = sim.snake[0]
+        if self.cycle and head in self.cycle:
+            nxt = self.cycle[head]
+            if (self.passable(sim, nxt, 1, danger) and self.step_to(sim, nxt) != OPPOSITE[sim.direction] and
+                    self.safe_after(sim, [nxt], danger, eats=False)):
+                return self.step_to(sim, nxt)
+
+        # Keep the most room, preferring moves that can still reach the tail.
+        # A cell an obstacle snake may step into is only taken when every
+        # free move is one: risking a collision beats a certain crash.
+        best = None
+        best_score = None
+        blocked = set(sim.snake[:-1]) | danger
+        for direction in DIRECTIONS:
+            if direction == OPPOSITE[sim.direction]:
+                continue
+            dx, dy = direction.value
+            pos = (head[0] + dx, head[1] + dy)
+            if not self.passable(sim, pos, 1, ()) or sim.board.has(Occupancy.OBSTACLE, pos):
+                continue
+            room, tail_ok = self.reachable(sim, pos, blocked | {pos}, target=sim.snake[-1])
+            score = (pos not in danger, tail_ok and len(sim.snake) > 1, room)
+            if best_score is None or score > best_score:
+                best, best_score = direction, score
+        return best
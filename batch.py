@@ -0,0 +1,237 @@
+import numpy as np
+
+from simulation import GRID_WIDTH, GRID_HEIGHT, MOVE_DELAY, MAX_LEVEL
+
+
+# Vectorized version of the simulation rules: N independent boards stepped
+# together with array operations. Direction indices follow the Direction enum
+# order (UP, DOWN, LEFT, RIGHT). Boards keep a fixed size for the whole batch,
+# so level ups add walls, speed and obstacle snakes but never grow the grid.
+# Walls are level // 2 random cells per level up, not the generated layouts.
+# Every obstacle snake moves like the simulation's 'wander' strategy.
+# Special food and power-up items are left out: food is always worth one point.
+
+EMPTY = 0
+SNAKE = 1
+WALL = 2
+FOOD = 3
+OBSTACLE = 4
+
+UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3
+DX = np.array([0, 0, -1, 1], dtype=np.int64)
+DY = np.array([-1, 1, 0, 0], dtype=np.int64)
+OPPOSITE = np.array([DOWN, UP, RIGHT, LEFT], dtype=np.int64)
+# Clockwise / counter-clockwise turn of each direction (ObstacleSnake.turn_direction)
+TURN_RIGHT = np.array([RIGHT, LEFT, UP, DOWN], dtype=np.int64)
+TURN_LEFT = np.array([LEFT, RIGHT, DOWN, UP], dtype=np.int64)
+
+# Death causes reported in step() info, matching Simulation.death_cause
+CAUSES = (None, 'bounds', 'wall', 'self', 'obstacle', 'win')
+CAUSE_NONE, CAUSE_BOUNDS, CAUSE_WALL, CAUSE_SELF, CAUSE_OBSTACLE, CAUSE_WIN = range(6)
+
+MAX_OBSTACLES = 3
+OBSTACLE_MOVE_DELAY = 200
+
+
+class BatchSnakeEnv:
+    def __init__(self, n, width=GRID_WIDTH, height=GRID_HEIGHT, seed=None):
+        self.n = n
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.rng = np.random.default_rng(seed)
+        self.envs = np.arange(n)
+
+        # Snake/wall cells per board; obstacle snakes may overlap, so they are counted
+        self.grid = np.zeros((n, height, width), dtype=np.int8)
+        self.obstacle_count = np.zeros((n, height, width), dtype=np.int8)
+        # Snake bodies as ring buffers of flat cell indices
+        self.body = np.zeros((n, self.cells), dtype=np.int32)
+        self.head = np.zeros(n, dtype=np.int64)
+        self.tail = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int64)
+        self.food = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.level = np.zeros(n, dtype=np.int64)
+        self.move_delay = np.zeros(n, dtype=np.int64)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.obstacle_pos = np.zeros((n, MAX_OBSTACLES), dtype=np.int64)
+        self.obstacle_dir = np.zeros((n, MAX_OBSTACLES), dtype=np.int64)
+        self.obstacle_timer = np.zeros((n, MAX_OBSTACLES), dtype=np.int64)
+        self.obstacle_active = np.zeros((n, MAX_OBSTACLES), dtype=bool)
+
+        self.reset()
+
+    def reset(self, envs=None):
+        if envs is None:
+            envs = self.envs
+        if len(envs) == 0:
+            return
+        self.grid[envs] = EMPTY
+        self.obstacle_count[envs] = 0
+        self.obstacle_active[envs] = False
+        self.obstacle_timer[envs] = 0
+        start = (self.height // 2) * self.width + self.width // 2
+        self.body[envs, 0] = start
+        self.head[envs] = 0
+        self.tail[envs] = 0
+        self.length[envs] = 1
+        self.grid.reshape(self.n, -1)[envs, start] = SNAKE
+        self.direction[envs] = RIGHT
+        self.score[envs] = 0
+        self.level[envs] = 1
+        self.move_delay[envs] = MOVE_DELAY
+        self.ticks[envs] = 0
+        self.food[envs], _ = self.random_free_cells(envs)
+
+    def random_free_cells(self, envs, exclude=None):
+        # Uniform pick of one free cell per board: argmax of random keys over the
+        # free mask. Returns (cells, found) where found is False on full boards.
+        flat = self.grid.reshape(self.n, -1)[envs]
+        free = (flat == EMPTY) & (self.obstacle_count.reshape(self.n, -1)[envs] == 0)
+        if exclude is not None:
+            free[np.arange(len(envs)), exclude] = False
+        keys = self.rng.random(free.shape)
+        keys[~free] = -1.0
+        cells = keys.argmax(axis=1)
+        return cells, free[np.arange(len(envs)), cells]
+
+    def observation(self):
+        obs = self.grid.copy()
+        flat = obs.reshape(self.n, -1)
+        flat[self.envs, self.food] = FOOD
+        obs[self.obstacle_count > 0] = OBSTACLE
+        return obs
+
+    def step(self, actions):
+        # Advance every board by one player move. Returns (reward, done, cause);
+        # finished boards are reset automatically.
+        n, w = self.n, self.width
+        envs = self.envs
+        flat = self.grid.reshape(n, -1)
+        obstacles = self.obstacle_count.reshape(n, -1)
+        self.ticks += 1
+        # Obstacle timers advance by the delay in force at the start of the tick
+        delay = self.move_delay.copy()
+
+        actions = np.asarray(actions, dtype=np.int64)
+        turn = actions != OPPOSITE[self.direction]
+        self.direction = np.where(turn, actions, self.direction)
+
+        head_cell = self.body[envs, self.head]
+        nx = head_cell % w + DX[self.direction]
+        ny = head_cell // w + DY[self.direction]
+        out = (nx < 0) | (nx >= w) | (ny < 0) | (ny >= self.height)
+        new_cell = np.where(out, 0, ny * w + nx)
+        target = flat[envs, new_cell]
+
+        cause = np.zeros(n, dtype=np.int64)
+        cause[(target == SNAKE) & ~out] = CAUSE_SELF
+        cause[(target == WALL) & ~out] = CAUSE_WALL
+        cause[(obstacles[envs, new_cell] > 0) & ~out & (cause == CAUSE_NONE)] = CAUSE_OBSTACLE
+        cause[out] = CAUSE_BOUNDS
+        alive = cause == CAUSE_NONE
+
+        # Grow the head, then drop the tail unless food was eaten
+        live = envs[alive]
+        self.head[live] = (self.head[live] + 1) % self.cells
+        self.body[live, self.head[live]] = new_cell[live]
+        flat[live, new_cell[live]] = SNAKE
+        eat = alive & (new_cell == self.food)
+        moved = envs[alive & ~eat]
+        flat[moved, self.body[moved, self.tail[moved]]] = EMPTY
+        self.tail[moved] = (self.tail[moved] + 1) % self.cells
+        self.length[eat] += 1
+
+        reward = eat.astype(np.float32)
+        eaten = envs[eat]
+        if len(eaten):
+            self.score[eaten] += 1
+            self.move_delay[eaten] = np.maximum(60, self.move_delay[eaten] - 2)
+            cells, found = self.random_free_cells(eaten)
+            self.food[eaten] = cells
+            cause[eaten[~found]] = CAUSE_WIN
+            leveled = eaten[found & (self.score[eaten] % 5 == 0) & (self.level[eaten] < MAX_LEVEL)]
+            self.level_up(leveled)
+
+        self.move_obstacles(cause == CAUSE_NONE, delay)
+
+        done = cause != CAUSE_NONE
+        reward[done & (cause != CAUSE_WIN)] = -1.0
+        self.reset(envs[done])
+        return reward, done, cause
+
+    def level_up(self, envs):
+        if len(envs) == 0:
+            return
+        self.level[envs] += 1
+        self.move_delay[envs] = np.maximum(40, self.move_delay[envs] - 8)
+        # Add level // 2 walls, one round per wall so boards needing fewer drop out
+        walls = self.level[envs] // 2
+        flat = self.grid.reshape(self.n, -1)
+        for k in range(int(walls.max())):
+            todo = envs[walls > k]
+            cells, found = self.random_free_cells(todo, self.food[todo])
+            flat[todo[found], cells[found]] = WALL
+        self.spawn_obstacles(envs)
+
+    def spawn_obstacles(self, envs):
+        obstacles = self.obstacle_count.reshape(self.n, -1)
+        for k in range(MAX_OBSTACLES):
+            old = envs[self.obstacle_active[envs, k]]
+            obstacles[old, self.obstacle_pos[old, k]] -= 1
+        self.obstacle_active[envs] = False
+        self.obstacle_timer[envs] = 0
+        count = np.clip(self.level[envs] - 4, 0, MAX_OBSTACLES)
+        for k in range(MAX_OBSTACLES):
+            todo = envs[count > k]
+            if len(todo) == 0:
+                break
+            cells, found = self.random_free_cells(todo)
+            todo = todo[found]
+            self.obstacle_pos[todo, k] = cells[found]
+            self.obstacle_dir[todo, k] = self.rng.integers(0, 4, len(todo))
+            self.obstacle_active[todo, k] = True
+            obstacles[todo, cells[found]] += 1
+
+    def blocked(self, envs, cells_x, cells_y):
+        w = self.width
+        out = (cells_x < 0) | (cells_x >= w) | (cells_y < 0) | (cells_y >= self.height)
+        cell = np.where(out, 0, cells_y * w + cells_x)
+        taken = ((self.grid.reshape(self.n, -1)[envs, cell] != EMPTY) |
+                 (self.obstacle_count.reshape(self.n, -1)[envs, cell] > 0))
+        return out | taken, cell
+
+    def move_obstacles(self, alive, delay):
+        # Same turning heuristic as WanderStrategy, one obstacle slot at a
+        # time so obstacles on the same board see each other's new positions
+        obstacles = self.obstacle_count.reshape(self.n, -1)
+        w = self.width
+        self.obstacle_timer[alive] += delay[alive, None]
+        for k in range(MAX_OBSTACLES):
+            due = alive & self.obstacle_active[:, k] & (self.obstacle_timer[:, k] > OBSTACLE_MOVE_DELAY)
+            envs = self.envs[due]
+            if len(envs) == 0:
+                continue
+            self.obstacle_timer[envs, k] = 0
+            pos = self.obstacle_pos[envs, k]
+            x, y = pos % w, pos // w
+            direction = self.obstacle_dir[envs, k]
+            blocked, cell = self.blocked(envs, x + DX[direction], y + DY[direction])
+            for turns in (TURN_RIGHT, TURN_LEFT, OPPOSITE):
+                alt = turns[direction]
+                alt_blocked, alt_cell = self.blocked(envs, x + DX[alt], y + DY[alt])
+                take = blocked & ~alt_blocked
+                direction = np.where(take, alt, direction)
+                cell = np.where(take, alt_cell, cell)
+                blocked = blocked & alt_blocked
+            # Boxed in: a move off the board is dropped, anything else goes ahead
+            ox = x + DX[direction]
+            oy = y + DY[direction]
+            inside = (ox >= 0) & (ox < w) & (oy >= 0) & (oy < self.height)
+            self.obstacle_dir[envs, k] = direction
+            envs, pos, cell = envs[inside], pos[inside], cell[inside]
+            obstacles[envs, pos] -= 1
+            obstacles[envs, cell] += 1
+            self.obstacle_pos[envs, k] = cell
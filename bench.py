@@ -0,0 +1,318 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+# Rendering benchmarks draw offscreen through SDL's dummy video driver
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import main as frontend
+import snapshot
+from autopilot import Autopilot, hamiltonian_cycle
+from montecarlo import ROLLOUT_DEPTH, RolloutBuffer, rollout
+from simulation import Direction, ITEM_CELLS, Occupancy, Simulation, MAX_GRID_WIDTH, MAX_GRID_HEIGHT, level_layout
+
+
+# Seeded, scripted benchmarks for the simulation and rendering hot paths.
+# Each benchmark returns per-iteration timings; results are written as JSON
+# and can be compared against a previous run to flag regressions:
+#
+#   python bench.py --json base.json
+#   python bench.py --baseline base.json --threshold 0.15
+
+SEED = 1234
+DIRECTIONS = {direction.value: direction for direction in Direction}
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    n = len(samples)
+    return {
+        'iterations': n,
+        'mean_us': sum(samples) / n * 1e6,
+        'p50_us': samples[n // 2] * 1e6,
+        'p95_us': samples[min(n - 1, n * 95 // 100)] * 1e6,
+        'max_us': samples[-1] * 1e6,
+    }
+
+
+def timed(fn, iterations, setup=None):
+    # setup runs untimed before each iteration
+    samples = []
+    clock = time.perf_counter
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = clock()
+        fn()
+        samples.append(clock() - start)
+    return samples
+
+
+def big_sim():
+    # Largest board the game grows to, so a 1000-cell snake fits
+    sim = Simulation(SEED)
+    sim.grid_width, sim.grid_height = MAX_GRID_WIDTH, MAX_GRID_HEIGHT
+    sim.rebuild_board()
+    return sim
+
+
+def cycle_sim(length):
+    # Snake of the given length laid along a Hamiltonian cycle of the board
+    sim = big_sim()
+    cycle = hamiltonian_cycle(sim.grid_width, sim.grid_height)
+    body = [(0, 0)]
+    while len(body) < length:
+        body.append(cycle[body[-1]])
+    body.reverse()
+    sim.snake = body
+    sim.rebuild_board()
+    return sim, cycle
+
+
+def bench_move_snake(length, iterations):
+    # The snake follows the cycle so it never dies, with no food to eat so
+    # its length stays fixed
+    sim, cycle = cycle_sim(length)
+    sim.food = None
+    body = sim.snake
+    turns = {}
+    pos = body[0]
+    for _ in range(sim.grid_width * sim.grid_height):
+        nxt = cycle[pos]
+        turns[pos] = DIRECTIONS[(nxt[0] - pos[0], nxt[1] - pos[1])]
+        pos = nxt
+
+    def tick():
+        sim.next_direction = turns[sim.snake[0]]
+        sim.move_snake()
+
+    samples = timed(tick, iterations)
+    assert not sim.game_over and len(sim.snake) == length
+    return samples
+
+
+def bench_place_food(free, iterations):
+    # Board walled over except for `free` cells
+    sim = big_sim()
+    sim.walls = []
+    for i in range(sim.grid_width * sim.grid_height - free):
+        pos = (i % sim.grid_width, i // sim.grid_width)
+        if not sim.board.has(Occupancy.SNAKE, pos):
+            sim.walls.append(pos)
+            sim.board.add(Occupancy.WALL, pos)
+    return timed(sim.place_food, iterations)
+
+
+def bench_snapshot(length, iterations):
+    sim, _ = cycle_sim(length)
+    return timed(lambda: snapshot.snapshot(sim), iterations)
+
+
+def bench_restore(length, iterations):
+    data = snapshot.snapshot(cycle_sim(length)[0])
+    return timed(lambda: snapshot.restore(data), iterations)
+
+
+def bench_rollout(iterations):
+    # One Monte Carlo rollout from the start of a game, buffer reset included
+    sim = Simulation(SEED)
+    buffer = RolloutBuffer()
+    rng = random.Random(SEED)
+    return timed(lambda: rollout(buffer, sim, sim.direction, ROLLOUT_DEPTH, rng), iterations)
+
+
+def bench_timed_items(items, iterations):
+    # Whole ticks with `items` power-ups out, each with an expiry timer
+    # pending, while the snake circles a small square so it never dies
+    sim = Simulation(SEED, board_size=(items * ITEM_CELLS // 200, 200))
+    while len(sim.items) < items:
+        sim.spawn_items()
+    loop = (Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP)
+
+    def tick():
+        sim.set_direction(loop[sim.tick // 4 % 4])
+        sim.step()
+        sim.events.clear()
+
+    samples = timed(tick, iterations)
+    assert not sim.game_over
+    return samples
+
+
+def bench_generate_level(level, iterations):
+    # Building a layout from scratch on the largest growing board, bypassing the cache
+    return timed(lambda: level_layout.__wrapped__(SEED, level, MAX_GRID_WIDTH, MAX_GRID_HEIGHT), iterations)
+
+
+def bench_level_up(iterations, board_size=None):
+    # Level 12 to 13 (a maze) with the layout already cached
+    sim = Simulation(SEED, board_size=board_size)
+    sim.layout_area(13, sim.grid_width, sim.grid_height)
+
+    def setup():
+        sim.level = 12
+
+    return timed(sim.level_up, iterations, setup=setup)
+
+
+def bench_autopilot(iterations, board_size=None):
+    # One decision per tick of an autopilot game, restarted when it dies
+    state = {}
+
+    def setup():
+        sim = state.get('sim')
+        if sim is None or sim.game_over:
+            sim = state['sim'] = Simulation(SEED, board_size=board_size)
+            state['autopilot'] = Autopilot()
+        else:
+            sim.step()
+
+    def decide():
+        state['sim'].set_direction(state['autopilot'](state['sim']) or state['sim'].direction)
+
+    return timed(decide, iterations, setup=setup)
+
+
+def new_game(particles=2048):
+    game = frontend.SnakeGame(seed=SEED)
+    game.particles = frontend.ParticleSystem(max_particles=particles, seed=SEED)
+    game.reset_game()
+    game.state = frontend.GameState.PLAYING
+    return game
+
+
+def keep_alive(game):
+    # Restart instead of letting a death end the scripted run
+    if game.state != frontend.GameState.PLAYING:
+        game.reset_game()
+        game.state = frontend.GameState.PLAYING
+
+
+def bench_update_game(particles, iterations):
+    game = new_game(particles)
+
+    def frame():
+        if len(game.particles) < particles:
+            game.particles.emit(frontend.WIDTH // 2, frontend.HEIGHT // 2, (255, 200, 0),
+                                particles - len(game.particles))
+        game.update_game(16)
+        keep_alive(game)
+
+    try:
+        return timed(frame, iterations)
+    finally:
+        game.scores.close()
+
+
+def bench_draw(iterations, dirty_rects=False, particles=0):
+    # One simulation tick between frames, steered by the autopilot so the
+    # snake keeps growing instead of dying every few moves; only draw is timed
+    game = new_game(max(particles, 1))
+    game.dirty_rects = dirty_rects
+    game.set_autopilot(True)
+
+    def tick():
+        if len(game.particles) < particles:
+            game.particles.emit(frontend.WIDTH // 2, frontend.HEIGHT // 2, (255, 200, 0),
+                                particles - len(game.particles))
+        game.update_game(game.sim.move_delay)
+        keep_alive(game)
+
+    try:
+        return timed(game.draw, iterations, setup=tick)
+    finally:
+        game.scores.close()
+
+
+BENCHMARKS = {
+    'move_snake/len10': lambda n: bench_move_snake(10, n * 20),
+    'move_snake/len100': lambda n: bench_move_snake(100, n * 20),
+    'move_snake/len1000': lambda n: bench_move_snake(1000, n * 20),
+    'place_food/free1': lambda n: bench_place_food(1, n * 20),
+    'place_food/free10': lambda n: bench_place_food(10, n * 20),
+    'snapshot/len100': lambda n: bench_snapshot(100, n * 20),
+    'snapshot/len1000': lambda n: bench_snapshot(1000, n * 20),
+    'restore/len100': lambda n: bench_restore(100, n * 20),
+    'restore/len1000': lambda n: bench_restore(1000, n * 20),
+    'montecarlo/rollout': lambda n: bench_rollout(n * 4),
+    'step/items400': lambda n: bench_timed_items(400, n * 20),
+    'level/generate_rooms': lambda n: bench_generate_level(8, n),
+    'level/generate_maze': lambda n: bench_generate_level(14, n),
+    'level/level_up': lambda n: bench_level_up(n * 4),
+    'level/level_up_500x500': lambda n: bench_level_up(n * 4, (500, 500)),
+    'autopilot/choose': lambda n: bench_autopilot(n),
+    'autopilot/choose_500x500': lambda n: bench_autopilot(n, (500, 500)),
+    'update_game/particles2000': lambda n: bench_update_game(2000, n),
+    'update_game/particles8000': lambda n: bench_update_game(8000, n),
+    'draw/full': lambda n: bench_draw(n),
+    'draw/dirty_rects': lambda n: bench_draw(n, dirty_rects=True),
+    'draw/particles1000': lambda n: bench_draw(n, particles=1000),
+}
+
+
+def run(names, iterations):
+    results = {}
+    for name in names:
+        # One untimed warm-up pass so caches, atlases and imports are settled
+        BENCHMARKS[name](max(1, iterations // 10))
+        results[name] = summarize(BENCHMARKS[name](iterations))
+    return results
+
+
+def compare(results, baseline, threshold):
+    # Median time against the baseline; returns the benchmarks that got slower
+    # by more than threshold (a fraction)
+    regressions = {}
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if not base:
+            continue
+        ratio = result['p50_us'] / base['p50_us']
+        result['baseline_p50_us'] = base['p50_us']
+        result['change'] = ratio - 1
+        if ratio - 1 > threshold:
+            regressions[name] = ratio - 1
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the snake simulation and renderer')
+    parser.add_argument('--iterations', type=int, default=500, help='timed iterations per benchmark (move/place run 20x)')
+    parser.add_argument('--only', action='append', metavar='PREFIX',
+                        help='run only benchmarks whose name starts with PREFIX (repeatable)')
+    parser.add_argument('--json', help='write results to this file instead of stdout')
+    parser.add_argument('--baseline', help='previous --json output to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='fractional slowdown in median time counted as a regression')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.only or any(name.startswith(p) for p in args.only)]
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'results': run(names, args.iterations),
+    }
+    regressions = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report['results'], json.load(f), args.threshold)
+        report['regressions'] = regressions
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    for name, change in sorted(regressions.items()):
+        print(f"REGRESSION {name}: median {change:+.0%}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,230 @@
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+from collections import Counter
+from multiprocessing import Pool
+
+from autopilot import Autopilot
+from montecarlo import MonteCarlo
+from replay import Replay, ReplayDesyncError, ReplayPlayer
+from simulation import Direction, ObstacleSnake, OPPOSITE, Simulation
+
+
+# Scores player controllers over many seeded headless games, spread across a
+# process pool. A controller is a callable taking the simulation and returning
+# the Direction to steer (or None to keep going); CONTROLLERS maps names to
+# factories so workers can rebuild them from a picklable name and seed.
+# Recorded replays can be scored the same way, re-simulated and verified.
+
+MAX_TICKS = 20000
+MONTE_CARLO_ROLLOUTS = 16
+
+
+def straight_controller(seed):
+    return lambda sim: None
+
+
+def random_controller(seed):
+    rng = random.Random(seed)
+    dirs = list(Direction)
+    return lambda sim: rng.choice(dirs)
+
+
+def obstacle_controller(seed):
+    # The ObstacleSnake turning heuristic driving the player
+    def control(sim):
+        return ObstacleSnake([sim.snake[0]], sim.direction).choose_direction(sim.board)[0]
+    return control
+
+
+def greedy_controller(seed):
+    # Step towards the food along any free neighbour, else fall back to the heuristic
+    def control(sim):
+        hx, hy = sim.snake[0]
+        best = None
+        best_dist = None
+        for direction in Direction:
+            if direction == OPPOSITE[sim.direction]:
+                continue
+            dx, dy = direction.value
+            pos = (hx + dx, hy + dy)
+            if sim.board.is_blocked(pos):
+                continue
+            dist = abs(pos[0] - sim.food.pos[0]) + abs(pos[1] - sim.food.pos[1]) if sim.food else 0
+            if best is None or dist < best_dist:
+                best, best_dist = direction, dist
+        if best is None:
+            return ObstacleSnake([sim.snake[0]], sim.direction).choose_direction(sim.board)[0]
+        return best
+    return control
+
+
+CONTROLLERS = {
+    'straight': straight_controller,
+    'random': random_controller,
+    'obstacle': obstacle_controller,
+    'greedy': greedy_controller,
+    'autopilot': lambda seed: Autopilot(),
+    # Rollouts run inline with a fixed count, so games stay reproducible and
+    # the process pool here is what spreads the work over cores
+    'montecarlo': lambda seed: MonteCarlo(workers=0, rollouts=MONTE_CARLO_ROLLOUTS, seed=seed),
+}
+
+
+def play_game(controller, seed, max_ticks=MAX_TICKS):
+    sim = Simulation(seed)
+    control = controller(seed)
+    while not sim.game_over and sim.tick < max_ticks:
+        direction = control(sim)
+        if direction is not None:
+            sim.set_direction(direction)
+        sim.step()
+        sim.events.clear()
+    cause = sim.death_cause if sim.game_over else 'timeout'
+    return sim.score, len(sim.snake), sim.level, cause, sim.tick
+
+
+def new_summary():
+    return {
+        'games': 0,
+        'ticks': 0,
+        'score': Counter(),
+        'length': Counter(),
+        'level': Counter(),
+        'cause': Counter(),
+    }
+
+
+def merge_summary(total, part):
+    total['games'] += part['games']
+    total['ticks'] += part['ticks']
+    for key in ('score', 'length', 'level', 'cause'):
+        total[key].update(part[key])
+    return total
+
+
+def play_replay(path):
+    player = ReplayPlayer(Replay.load(path))
+    try:
+        sim = player.play()
+        cause = sim.death_cause if sim.game_over else 'unfinished'
+    except ReplayDesyncError:
+        sim = player.sim
+        cause = 'desync'
+    return sim.score, len(sim.snake), sim.level, cause, sim.tick
+
+
+def add_result(summary, result):
+    score, length, level, cause, ticks = result
+    summary['games'] += 1
+    summary['ticks'] += ticks
+    summary['score'][score] += 1
+    summary['length'][length] += 1
+    summary['level'][level] += 1
+    summary['cause'][cause] += 1
+
+
+def run_chunk(args):
+    # Worker entry point: play a batch of seeds and return one merged summary,
+    # so only a handful of small dicts cross the process boundary
+    name, seeds, max_ticks = args
+    controller = CONTROLLERS[name]
+    summary = new_summary()
+    for seed in seeds:
+        add_result(summary, play_game(controller, seed, max_ticks))
+    return summary
+
+
+def run_replay_chunk(paths):
+    summary = new_summary()
+    for path in paths:
+        try:
+            result = play_replay(path)
+        except (OSError, ValueError):
+            # Counted by cause only, so they don't skew the score stats
+            summary['cause']['unreadable'] += 1
+            continue
+        add_result(summary, result)
+    return summary
+
+
+def run_pool(worker, chunks, workers):
+    # workers=None uses every core; 0 or 1 runs the chunks inline
+    total = new_summary()
+    if workers is not None and workers <= 1:
+        for chunk in chunks:
+            merge_summary(total, worker(chunk))
+    else:
+        with Pool(workers) as pool:
+            for part in pool.imap_unordered(worker, chunks):
+                merge_summary(total, part)
+    return total
+
+
+def evaluate(name, games=1000, first_seed=0, workers=None, chunk_size=50, max_ticks=MAX_TICKS):
+    seeds = range(first_seed, first_seed + games)
+    chunks = [(name, seeds[i:i + chunk_size], max_ticks) for i in range(0, games, chunk_size)]
+    return run_pool(run_chunk, chunks, workers)
+
+
+def evaluate_replays(paths, workers=None, chunk_size=50):
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    return run_pool(run_replay_chunk, chunks, workers)
+
+
+def describe(summary):
+    def stats(counter):
+        n = sum(counter.values())
+        if not n:
+            return {}
+        values = sorted(counter.elements())
+        return {
+            'mean': sum(values) / n,
+            'min': values[0],
+            'p50': values[n // 2],
+            'p90': values[min(n - 1, n * 9 // 10)],
+            'max': values[-1],
+            'histogram': {str(k): v for k, v in sorted(counter.items())},
+        }
+
+    return {
+        'games': summary['games'],
+        'ticks': summary['ticks'],
+        'score': stats(summary['score']),
+        'length': stats(summary['length']),
+        'level': stats(summary['level']),
+        'cause': dict(summary['cause'].most_common()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Evaluate snake controllers over seeded headless games')
+    parser.add_argument('--controller', choices=sorted(CONTROLLERS), default='greedy')
+    parser.add_argument('--games', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0, help='first seed; games use consecutive seeds')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: CPU count, 0 = inline)')
+    parser.add_argument('--chunk-size', type=int, default=50)
+    parser.add_argument('--max-ticks', type=int, default=MAX_TICKS)
+    parser.add_argument('--replays', metavar='DIR', help='score the recorded replays in DIR instead')
+    parser.add_argument('--json', help='write the summary to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    if args.replays:
+        paths = sorted(glob.glob(os.path.join(args.replays, '*.snkr')))
+        summary = describe(evaluate_replays(paths, args.workers, args.chunk_size))
+    else:
+        summary = describe(evaluate(args.controller, args.games, args.seed, args.workers,
+                                    args.chunk_size, args.max_ticks))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+import argparse
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# No window: SDL's dummy video driver keeps the display surface in memory
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+
+from main import CELL_SIZE, GameState, SnakeGame, parse_board_size
+from replay import Replay
+from simulation import GRID_WIDTH, GRID_HEIGHT
+
+
+# Offscreen rendering for machines without a display, e.g. to make gameplay
+# videos or feed vision agents. SnakeGame draws exactly as it would in a
+# window, and each frame is read back as a NumPy view of the surface pixels
+# (pygame.surfarray.pixels3d), so nothing is copied until a frame is
+# exported. A view locks the surface, and a locked surface can't be drawn
+# on: views are dropped before the next frame, and anything that must
+# outlive a frame has to be copied.
+#
+# Export copies frames into preallocated batches, and a background thread
+# writes each full batch as a raw RGB24 stream (to pipe into ffmpeg), one
+# .npy file per batch, or numbered PNGs. The writer never calls into pygame,
+# which isn't thread-safe: PNGs are encoded straight from the arrays.
+#
+#   python headless.py --board 60x45 - | ffmpeg -f rawvideo -pix_fmt rgb24 -s 625x600 -r 30 -i - snake.mp4
+
+FPS = 30
+BATCH_FRAMES = 32
+BATCH_BUFFERS = 3  # batches being filled or written at once
+FORMATS = ('raw', 'npy', 'png')
+
+
+class OffscreenRenderer:
+    # Runs a SnakeGame one frame of game time per advance() and draws it
+    def __init__(self, game, fps=FPS):
+        self.game = game
+        self.dt = 1000 / fps
+        self.view = None
+
+    def advance(self):
+        # Returns False once the game has ended
+        self.view = None
+        game = self.game
+        game.update_game(self.dt)
+        game.draw()
+        return game.state == GameState.PLAYING
+
+    def frame(self):
+        # The whole frame as a (height, width, 3) RGB view of the surface
+        if self.view is None:
+            self.view = pygame.surfarray.pixels3d(self.game.screen).transpose(1, 0, 2)
+        return self.view
+
+    def observation(self):
+        # One pixel from the middle of each board cell in view, as a
+        # (rows, cols, 3) view of the frame
+        game = self.game
+        width, height = game.play_size()
+        ox, oy = (game.camera.x, game.camera.y) if game.camera else (0, 0)
+        x0 = (CELL_SIZE // 2 - ox) % CELL_SIZE
+        y0 = (CELL_SIZE // 2 - oy) % CELL_SIZE
+        return self.frame()[y0:height:CELL_SIZE, x0:width:CELL_SIZE]
+
+
+def png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_png(path, frame):
+    # frame is a (height, width, 3) uint8 array; rows are stored unfiltered
+    height, width = frame.shape[:2]
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = frame.reshape(height, width * 3)
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)  # 8-bit RGB
+    with open(path, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(png_chunk(b'IHDR', header))
+        f.write(png_chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)))
+        f.write(png_chunk(b'IEND', b''))
+
+
+def largest_frame(game):
+    # Window size on the biggest board this game can grow to
+    sim = game.sim
+    if sim.board_size:
+        return game.screen.get_size()
+    width, height = GRID_WIDTH, GRID_HEIGHT
+    for level in range(2, sim.max_level + 1):
+        width, height = sim.grown_size(level, width, height)
+    return width * CELL_SIZE, height * CELL_SIZE + 100
+
+
+class FrameExporter:
+    # Frames are copied into (batch, height, width, 3) arrays from a small
+    # pool, and full batches go to a writer thread; add() waits for a free
+    # array when the writer falls behind. Frames smaller than size (the
+    # window grows with the board) are padded with black to the bottom right.
+    def __init__(self, path, fmt, size, batch=BATCH_FRAMES):
+        self.path = path
+        self.format = fmt
+        self.batch = batch
+        width, height = size
+        self.free = queue.Queue()
+        for _ in range(BATCH_BUFFERS):
+            self.free.put(np.zeros((batch, height, width, 3), dtype=np.uint8))
+        self.full = queue.Queue()
+        self.current = None
+        self.count = 0
+        self.written = 0
+        if fmt == 'raw':
+            self.out = sys.stdout.buffer if path == '-' else open(path, 'wb')
+        else:
+            self.out = None
+            os.makedirs(path, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name='frame-writer', daemon=True)
+        self.thread.start()
+
+    def add(self, frame):
+        if self.current is None:
+            self.current = self.free.get()
+        height, width = frame.shape[:2]
+        out = self.current[self.count]
+        out[:height, :width] = frame
+        if height < out.shape[0] or width < out.shape[1]:
+            out[height:] = 0
+            out[:height, width:] = 0
+        self.count += 1
+        if self.count == self.batch:
+            self.flush()
+
+    def flush(self):
+        if self.count:
+            self.full.put((self.current, self.count))
+            self.current = None
+            self.count = 0
+
+    def close(self):
+        self.flush()
+        self.full.put(None)
+        self.thread.join()
+
+    def run(self):
+        while True:
+            item = self.full.get()
+            if item is None:
+                break
+            frames, count = item
+            self.write(frames[:count])
+            self.free.put(frames)
+        if self.out is not None:
+            self.out.flush()
+            if self.out is not sys.stdout.buffer:
+                self.out.close()
+
+    def write(self, frames):
+        if self.format == 'raw':
+            # A leading slice of a C-contiguous array is contiguous too
+            self.out.write(frames.data)
+        elif self.format == 'npy':
+            np.save(os.path.join(self.path, f"frames_{self.written:06d}.npy"), frames)
+        else:
+            for i, frame in enumerate(frames):
+                write_png(os.path.join(self.path, f"frame_{self.written + i:06d}.png"), frame)
+        self.written += len(frames)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Render games offscreen and export the frames')
+    parser.add_argument('out', help="raw stream file ('-' for stdout), or a directory for npy and png")
+    parser.add_argument('--format', choices=FORMATS, default='raw')
+    parser.add_argument('--cells', action='store_true',
+                        help='export one pixel per board cell instead of whole frames')
+    parser.add_argument('--frames', type=int, default=900, help='frames to render at most')
+    parser.add_argument('--fps', type=int, default=FPS, help='frames per second of game time')
+    parser.add_argument('--batch', type=int, default=BATCH_FRAMES, help='frames written at a time')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--board', type=parse_board_size, metavar='WxH',
+                        help='play on a fixed WxH board with a scrolling camera')
+    parser.add_argument('--replay', metavar='FILE', help='render a recorded replay instead of the autopilot')
+    parser.add_argument('--restart', action='store_true', help='start a new game when one ends')
+    args = parser.parse_args(argv)
+
+    game = SnakeGame(seed=args.seed, board_size=args.board)
+    if args.replay:
+        game.start_replay(Replay.load(args.replay))
+    else:
+        # The autopilot only searches a window around the head, so it keeps
+        # up on any --board size
+        game.set_autopilot(True)
+        game.reset_game()
+        game.state = GameState.PLAYING
+    renderer = OffscreenRenderer(game, args.fps)
+    width, height = largest_frame(game)
+    if args.cells:
+        width, height = -(-width // CELL_SIZE), -(-(height - 100) // CELL_SIZE)
+    exporter = FrameExporter(args.out, args.format, (width, height), args.batch)
+
+    start = time.perf_counter()
+    frames = 0
+    try:
+        while frames < args.frames:
+            playing = renderer.advance()
+            exporter.add(renderer.observation() if args.cells else renderer.frame())
+            frames += 1
+            if not playing:
+                if not args.restart or args.replay:
+                    break
+                game.reset_game()
+                game.state = GameState.PLAYING
+    finally:
+        renderer.view = None
+        exporter.close()
+        game.scores.close()
+    elapsed = time.perf_counter() - start
+    # stdout may be the video stream
+    print(f"{frames} frames of {width}x{height} in {elapsed:.1f} s ({frames / elapsed:.0f} fps), "
+          f"score {game.sim.score}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,29 @@
+import time
+STARTED = time.perf_counter()  # --startup-report counts from here, imports included
+
+import argparse
 import pygame
-import random
 import sys
 import math
-import json
+import numpy as np
+import random
+from collections import OrderedDict, deque
 from enum import Enum
 
+from autopilot import Autopilot
+from profiler import FrameProfiler, StartupTimer
+from replay import Replay, ReplayPlayer, ReplayRecorder, ReplayWriter, replay_path
+from scores import HighScores
+from simulation import (GRID_WIDTH, GRID_HEIGHT, ITEM_KINDS, MOVE_DELAY, Direction, FoodType, Simulation,
+                        TickScheduler)
+import snapshot
 
-pygame.init()
 
-
-GRID_WIDTH = 25
-GRID_HEIGHT = 20
 CELL_SIZE = 25
 WIDTH = GRID_WIDTH * CELL_SIZE
 HEIGHT = GRID_HEIGHT * CELL_SIZE + 100  
 FPS = 60
-MOVE_DELAY = 120  
+REWIND_TICKS = 10  # ticks undone per press of Backspace
 
 
 COLORS = {
@@ -27,6 +35,9 @@ COLORS = {
     'food': (255, 100, 100),
     'special_food': (255, 215, 0),
     'wall': (150, 75, 0),
+    'slow': (100, 180, 255),
+    'shrink': (255, 160, 60),
+    'ghost': (210, 210, 255),
     'text': (255, 255, 255),
     'ui_bg': (30, 35, 50),
     'button': (70, 130, 180),
@@ -39,81 +50,351 @@ class GameState(Enum):
     PAUSED = 3
     GAME_OVER = 4
 
-class FoodType(Enum):
-    NORMAL = 1
-    SPECIAL = 2
-
-class Direction(Enum):
-    UP = (0, -1)
-    DOWN = (0, 1)
-    LEFT = (-1, 0)
-    RIGHT = (1, 0)
-
-class Particle:
-    def __init__(self, x, y, color, velocity, lifetime):
-        self.x = x
-        self.y = y
-        self.color = color
-        self.velocity = velocity
-        self.lifetime = lifetime
-        self.max_lifetime = lifetime
-        self.size = random.randint(2, 5)
+class ParticleSystem:
+    # Structure-of-arrays particle pool: one NumPy column per attribute, kept
+    # packed in [0, count) so updates are vectorized and dead particles are
+    # compacted in a single pass. New particles beyond max_particles are dropped.
+    def __init__(self, max_particles=2048, seed=None):
+        self.max_particles = max_particles
+        # The generator is made on first use: setting up numpy.random costs
+        # more at startup than everything else the menu needs
+        self.seed = seed
+        self.rng = None
+        self.x = np.zeros(max_particles)
+        self.y = np.zeros(max_particles)
+        self.vx = np.zeros(max_particles)
+        self.vy = np.zeros(max_particles)
+        self.lifetime = np.zeros(max_particles)
+        self.max_lifetime = np.ones(max_particles)
+        self.size = np.zeros(max_particles)
+        self.color = np.zeros((max_particles, 3), dtype=np.uint8)
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def clear(self):
+        self.count = 0
+    
+    def emit(self, x, y, color, count):
+        start = self.count
+        end = min(self.max_particles, start + count)
+        n = end - start
+        if n <= 0:
+            return
+        self.warm()
+        angle = self.rng.uniform(0, 2 * math.pi, n)
+        speed = self.rng.uniform(50, 150, n)
+        lifetime = self.rng.uniform(500, 1000, n)
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.vx[start:end] = np.cos(angle) * speed
+        self.vy[start:end] = np.sin(angle) * speed
+        self.lifetime[start:end] = lifetime
+        self.max_lifetime[start:end] = lifetime
+        self.size[start:end] = self.rng.integers(2, 6, n)
+        self.color[start:end] = color
+        self.count = end
+    
+    def warm(self):
+        if self.rng is None:
+            self.rng = np.random.default_rng(self.seed)
     
     def update(self, dt):
-        self.x += self.velocity[0] * dt
-        self.y += self.velocity[1] * dt
-        self.lifetime -= dt
-        self.velocity = (self.velocity[0] * 0.98, self.velocity[1] * 0.98)
+        n = self.count
+        if not n:
+            return
+        self.x[:n] += self.vx[:n] * dt
+        self.y[:n] += self.vy[:n] * dt
+        self.lifetime[:n] -= dt
+        self.vx[:n] *= 0.98
+        self.vy[:n] *= 0.98
+        
+        alive = self.lifetime[:n] > 0
+        alive_count = int(np.count_nonzero(alive))
+        if alive_count < n:
+            for column in (self.x, self.y, self.vx, self.vy, self.lifetime,
+                           self.max_lifetime, self.size, self.color):
+                column[:alive_count] = column[:n][alive]
+            self.count = alive_count
     
-    def draw(self, surface):
-        alpha = max(0, self.lifetime / self.max_lifetime)
-        color = (*self.color, int(255 * alpha))
-        size = int(self.size * alpha)
-        if size > 0:
-            pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), size)
-    
-    def is_alive(self):
-        return self.lifetime > 0
+    def draw(self, surface, offset=(0, 0)):
+        # Returns the rects drawn, for dirty-rectangle rendering. offset is the
+        # camera position subtracted from particle coordinates.
+        n = self.count
+        if not n:
+            return []
+        alpha = np.maximum(0, self.lifetime[:n] / self.max_lifetime[:n])
+        size = (self.size[:n] * alpha).astype(np.int64)
+        x = self.x[:n].astype(np.int64) - offset[0]
+        y = self.y[:n].astype(np.int64) - offset[1]
+        width, height = surface.get_size()
+        visible = np.flatnonzero((size > 0) & (x + size >= 0) & (x - size < width) &
+                                 (y + size >= 0) & (y - size < height))
+        rects = []
+        for i in visible.tolist():
+            rects.append(pygame.draw.circle(surface, self.color[i], (int(x[i]), int(y[i])), int(size[i])))
+        return rects
 
-class Food:
-    def __init__(self, pos, food_type=FoodType.NORMAL):
-        self.pos = pos
-        self.type = food_type
+class FoodSprite:
+    # Pulse/spin animation clock for whatever food the simulation currently has
+    def __init__(self):
         self.animation_time = 0
-        self.scale = 1.0
-        self.rotation = 0
     
     def update(self, dt):
         self.animation_time += dt
-        self.scale = 1.0 + 0.1 * math.sin(self.animation_time * 0.005)
-        self.rotation += dt * 0.002
+
+class SpriteAtlas:
+    # Snake, obstacle and food tiles pre-rendered once per cell size, so the
+    # board is drawn with one batched blits() call instead of shape drawing
+    COLORKEY = (255, 0, 255)
+    FOOD_FRAMES = 64
+    # One full pulse of the food scale; the star's five-fold spin repeats
+    # exactly twice in that time, so one frame table covers both
+    FOOD_PERIOD = 2 * math.pi / 0.005
     
-    def draw(self, surface):
-        x, y = self.pos[0] * CELL_SIZE + CELL_SIZE // 2, self.pos[1] * CELL_SIZE + CELL_SIZE // 2
-        size = int(CELL_SIZE * 0.4 * self.scale)
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.heads = {direction: self.build_head(direction) for direction in Direction}
+        self.body = self.build_tile(COLORS['snake_body'], 1)
+        self.tail = self.build_tile(COLORS['snake_tail'], 3)
+        self.obstacle_head = self.build_tile((200, 50, 200), 2)
+        self.obstacle_body = self.build_tile((150, 0, 150), 2)
+        self.items = {kind: self.build_item(COLORS[kind]) for kind in ITEM_KINDS}
+        # Food frames are most of the work, so they are built on first use or
+        # ahead of time by warm()
+        self.food = {food_type: [None] * self.FOOD_FRAMES for food_type in FoodType}
+    
+    def warm(self):
+        # Generator for Warmup: builds the missing food frames one at a time
+        for food_type, frames in self.food.items():
+            for i in range(self.FOOD_FRAMES):
+                if frames[i] is None:
+                    frames[i] = self.build_food(food_type, i * self.FOOD_PERIOD / self.FOOD_FRAMES)
+                    yield
+    
+    def new_surface(self):
+        surface = pygame.Surface((self.cell_size, self.cell_size)).convert()
+        surface.fill(self.COLORKEY)
+        surface.set_colorkey(self.COLORKEY)
+        return surface
+    
+    def build_tile(self, color, inset):
+        surface = self.new_surface()
+        pygame.draw.rect(surface, color, (inset, inset, self.cell_size - 2 * inset, self.cell_size - 2 * inset))
+        return surface
+    
+    def build_head(self, direction):
+        size = self.cell_size
+        surface = self.build_tile(COLORS['snake_head'], 2)
+        
+        # Eyes based on direction
+        eye_size = 3
+        if direction == Direction.UP:
+            eye1_pos = (6, 8)
+            eye2_pos = (size - 9, 8)
+        elif direction == Direction.DOWN:
+            eye1_pos = (6, size - 11)
+            eye2_pos = (size - 9, size - 11)
+        elif direction == Direction.LEFT:
+            eye1_pos = (8, 6)
+            eye2_pos = (8, size - 9)
+        else:  # RIGHT
+            eye1_pos = (size - 11, 6)
+            eye2_pos = (size - 11, size - 9)
+        
+        pygame.draw.circle(surface, COLORS['text'], eye1_pos, eye_size)
+        pygame.draw.circle(surface, COLORS['text'], eye2_pos, eye_size)
+        return surface
+    
+    def build_item(self, color):
+        surface = self.new_surface()
+        center = self.cell_size // 2
+        pygame.draw.circle(surface, color, (center, center), self.cell_size // 3)
+        pygame.draw.circle(surface, COLORS['text'], (center, center), self.cell_size // 3, 2)
+        return surface
+    
+    def build_food(self, food_type, animation_time):
+        surface = self.new_surface()
+        scale = 1.0 + 0.1 * math.sin(animation_time * 0.005)
+        rotation = animation_time * 0.002
+        x = y = self.cell_size // 2
+        size = int(self.cell_size * 0.4 * scale)
         
-        if self.type == FoodType.SPECIAL:
+        if food_type == FoodType.SPECIAL:
             # Draw special food with star shape
             color = COLORS['special_food']
             points = []
             for i in range(10):
-                angle = self.rotation + i * math.pi / 5
+                angle = rotation + i * math.pi / 5
                 radius = size if i % 2 == 0 else size * 0.5
                 px = x + radius * math.cos(angle)
                 py = y + radius * math.sin(angle)
                 points.append((px, py))
-            if len(points) > 2:
-                pygame.draw.polygon(surface, color, points)
+            pygame.draw.polygon(surface, color, points)
         else:
             # Draw normal food as circle
             pygame.draw.circle(surface, COLORS['food'], (x, y), size)
             pygame.draw.circle(surface, (255, 150, 150), (x, y), size, 2)
+        return surface
+    
+    def food_frame(self, food_type, animation_time):
+        phase = (animation_time % self.FOOD_PERIOD) / self.FOOD_PERIOD
+        i = int(phase * self.FOOD_FRAMES) % self.FOOD_FRAMES
+        frames = self.food[food_type]
+        if frames[i] is None:
+            frames[i] = self.build_food(food_type, i * self.FOOD_PERIOD / self.FOOD_FRAMES)
+        return frames[i]
+    
+    def segment(self, direction, is_head, is_tail):
+        if is_head:
+            return self.heads[direction]
+        return self.tail if is_tail else self.body
+
+class Warmup:
+    # Deferred startup work, run a slice at a time after each frame so the
+    # menu shows as soon as the window is open. Jobs are generators that
+    # yield after each small unit of work. Everything warmed here is also
+    # built on demand, so nothing breaks if the player is quicker.
+    def __init__(self, budget=0.004):
+        self.budget = budget
+        self.jobs = deque()
+        self.busy = 0.0
+        self.frames = 0
+    
+    def add(self, job):
+        self.jobs.append(job)
+    
+    def run(self):
+        # Returns True once every job has finished
+        if not self.jobs:
+            return True
+        start = time.perf_counter()
+        deadline = start + self.budget
+        while self.jobs and time.perf_counter() < deadline:
+            try:
+                next(self.jobs[0])
+            except StopIteration:
+                self.jobs.popleft()
+        self.busy += time.perf_counter() - start
+        self.frames += 1
+        return not self.jobs
+    
+    def finish(self):
+        while self.jobs:
+            for _ in self.jobs.popleft():
+                pass
+
+class ChunkCache:
+    # Background for boards too big to pre-render whole: grid lines and walls
+    # in CHUNK x CHUNK cell tiles, built on first sight and evicted LRU.
+    # Walls only change when a level up swaps in a new wall list, and then
+    # every tile is rebuilt.
+    CHUNK = 16
+    
+    def __init__(self, cell_size, max_chunks=64):
+        self.cell_size = cell_size
+        self.max_chunks = max_chunks
+        self.chunks = OrderedDict()
+        self.walls = None
+    
+    def clear(self):
+        self.chunks.clear()
+        self.walls = None
+    
+    def sync(self, sim):
+        # Drop every tile once the sim has a different wall list
+        if sim.walls is not self.walls:
+            self.clear()
+            self.walls = sim.walls
+    
+    def get(self, sim, cx, cy):
+        key = (cx, cy)
+        tile = self.chunks.get(key)
+        if tile is not None:
+            self.chunks.move_to_end(key)
+            return tile
+        tile = self.chunks[key] = self.build(sim, cx, cy)
+        if len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return tile
+    
+    def build(self, sim, cx, cy):
+        size = self.cell_size
+        x0, y0 = cx * self.CHUNK, cy * self.CHUNK
+        cols = min(self.CHUNK, sim.grid_width - x0)
+        rows = min(self.CHUNK, sim.grid_height - y0)
+        width, height = cols * size, rows * size
+        # One pixel extra for the closing grid line, which the next tile
+        # overdraws with its own
+        tile = pygame.Surface((width + 1, height + 1)).convert()
+        tile.fill(COLORS['bg'])
+        for x in range(cols + 1):
+            pygame.draw.line(tile, COLORS['grid'], (x * size, 0), (x * size, height))
+        for y in range(rows + 1):
+            pygame.draw.line(tile, COLORS['grid'], (0, y * size), (width, y * size))
+        board = sim.board
+        for y in range(rows):
+            for x in range(cols):
+                if board.has(board.WALL, (x0 + x, y0 + y)):
+                    pygame.draw.rect(tile, COLORS['wall'], (x * size + 2, y * size + 2, size - 4, size - 4))
+        return tile
+
+class Camera:
+    # Top-left pixel of the part of the board shown in a fixed-size viewport,
+    # centred on the snake's head and clamped to the board edges
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.x = 0
+        self.y = 0
+    
+    def follow(self, center, board_width, board_height):
+        self.x = int(max(0, min(center[0] - self.width // 2, board_width - self.width)))
+        self.y = int(max(0, min(center[1] - self.height // 2, board_height - self.height)))
+
+class TextCache:
+    # Rendered text surfaces keyed by (font, text, color) with LRU eviction,
+    # so HUD labels are only re-rendered when their value changes
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate(),
+            'size': len(self.surfaces),
+            'max_size': self.max_size,
+        }
 
 class Button:
-    def __init__(self, x, y, width, height, text, font):
+    def __init__(self, x, y, width, height, text, font, text_cache):
         self.rect = pygame.Rect(x, y, width, height)
         self.text = text
         self.font = font
+        self.text_cache = text_cache
         self.hovered = False
     
     def handle_event(self, event):
@@ -129,165 +410,313 @@ class Button:
         pygame.draw.rect(surface, color, self.rect)
         pygame.draw.rect(surface, COLORS['text'], self.rect, 2)
         
-        text_surface = self.font.render(self.text, True, COLORS['text'])
+        text_surface = self.text_cache.render(self.font, self.text, COLORS['text'])
         text_rect = text_surface.get_rect(center=self.rect.center)
         surface.blit(text_surface, text_rect)
 
-class ObstacleSnake:
-    def __init__(self, body, direction):
-        self.body = body  # list of (x, y)
-        self.direction = direction  # Direction enum
-        self.move_delay = 200
-        self.last_move = 0
-
-    def move(self, grid_width, grid_height, walls, main_snake):
-        # Simple AI: move forward, turn if about to hit wall or itself or main snake
-        dx, dy = self.direction.value
-        head = (self.body[0][0] + dx, self.body[0][1] + dy)
-        if (head[0] < 0 or head[0] >= grid_width or
-            head[1] < 0 or head[1] >= grid_height or
-            head in self.body or head in walls or head in main_snake):
-            # Try turning right, then left
-            for turn in [1, -1]:
-                new_dir = self.turn_direction(turn)
-                dx, dy = new_dir.value
-                new_head = (self.body[0][0] + dx, self.body[0][1] + dy)
-                if (0 <= new_head[0] < grid_width and 0 <= new_head[1] < grid_height and
-                    new_head not in self.body and new_head not in walls and new_head not in main_snake):
-                    self.direction = new_dir
-                    head = new_head
-                    break
-        self.body.insert(0, head)
-        self.body.pop()
-
-    def turn_direction(self, turn):
-        dirs = [Direction.UP, Direction.RIGHT, Direction.DOWN, Direction.LEFT]
-        idx = dirs.index(self.direction)
-        return dirs[(idx + turn) % 4]
-
-    def draw(self, surface):
-        for i, pos in enumerate(self.body):
-            x, y = pos[0] * CELL_SIZE, pos[1] * CELL_SIZE
-            color = (200, 50, 200) if i == 0 else (150, 0, 150)
-            pygame.draw.rect(surface, color, (x + 2, y + 2, CELL_SIZE - 4, CELL_SIZE - 4))
+def init_pygame():
+    # Only the subsystems the game uses. pygame.init() also brings up audio
+    # and joysticks, which can take longer than the rest of startup together.
+    pygame.display.init()
+    pygame.font.init()
 
 class SnakeGame:
-    def __init__(self):
+    def __init__(self, seed=None, dirty_rects=False, report_cache_stats=False, smooth=False, record_dir=None,
+                 player_name='Player', profile=False, trace_path=None, board_size=None, report_startup=False):
+        # Startup phases are timed from the top of this module; report_startup
+        # prints them once the first frame is up and the warmup is done
+        self.startup = StartupTimer(STARTED)
+        self.report_startup = report_startup
+        self.startup.mark('imports')
+        init_pygame()
+        self.startup.mark('pygame init')
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption('Enhanced Snake Game')
         self.clock = pygame.time.Clock()
+        self.startup.mark('window')
         
-        
-        self.font_small = pygame.font.Font(None, 24)
-        self.font_medium = pygame.font.Font(None, 36)
-        self.font_large = pygame.font.Font(None, 48)
-        self.font_huge = pygame.font.Font(None, 72)
+        # Fonts load on first use; the menu only needs three of the four
+        self.fonts = {}
+        self.text_cache = TextCache()
+        self.report_cache_stats = report_cache_stats
         
         
         self.state = GameState.MENU
         
         
-        self.last_move = 0
-        self.move_delay = MOVE_DELAY
+        # Simulation ticks run on a fixed timestep, independent of the frame rate
+        self.scheduler = TickScheduler()
+        self.turbo = False
+        self.smooth = smooth
         
         
-        self.particles = []
+        self.particles = ParticleSystem(seed=seed)
+        self.food_sprite = FoodSprite()
+        self.atlas = SpriteAtlas(CELL_SIZE)
+        self.startup.mark('sprites')
         
+        # Grid lines and walls only change on level up, so they are rendered
+        # once into a cached surface and blitted each frame
+        self.background = None
         
-        self.level = 1
-        self.max_level = 20
-        self.grid_width = GRID_WIDTH
-        self.grid_height = GRID_HEIGHT
-        self.obstacle_snakes = []
-        self.reset_game()
+        # Dirty-rectangle mode: while playing, only cells, particles and HUD
+        # text that changed since the last frame are redrawn and pushed
+        self.dirty_rects = dirty_rects
+        self.drawn = None
+        
+        # Large-board mode (fixed board_size): the window stays put and a camera
+        # follows the head, drawing only the cells in view over chunked tiles
+        self.camera = None
+        self.chunks = ChunkCache(CELL_SIZE)
+        
+        
+        # All game rules live in the headless simulation; this class only
+        # renders it and feeds it input
+        self.sim = Simulation(seed, board_size=board_size)
+        self.first_seed = seed
+        self.fit_window()
+        
+        # Replays: every game is recorded to record_dir when set, written by a
+        # background thread; a ReplayPlayer drives the simulation when watching one
+        self.record_dir = record_dir
+        self.replay_writer = ReplayWriter() if record_dir else None
+        self.recorder = None
+        self.player = None
+        self.replay_speed = 1.0
+        
+        # Autopilot steers the player snake when set (attract mode, soak tests)
+        self.autopilot = None
+        
+        # Recent ticks kept for Backspace rewinds; off while recording,
+        # since a replay can't follow the game back in time. Games continued
+        # from a rewind or a loaded save stay off the leaderboard.
+        self.rewind = None if record_dir else snapshot.RewindBuffer()
+        self.restored = False
+        
+        # Profiling: F3 toggles the overlay; trace_path gets a Chrome trace on exit
+        self.profiler = FrameProfiler(trace=trace_path is not None)
+        self.trace_path = trace_path
+        self.show_profile = False
+        self.profile_lines = []
+        self.draw_calls = 0
+        self.set_profile_overlay(profile)
         
         
         self.create_buttons()
+        self.startup.mark('game setup')
         
-        # High score
-        self.high_score = self.load_high_score()
+        # High score and leaderboard, saved by a background thread
+        self.scores = HighScores()
+        self.high_score = self.scores.best
+        self.player_name = player_name
+        self.rank = None
+        self.startup.mark('scores')
+        
+        # Whatever the first menu frame doesn't need is built between frames
+        self.warmup = Warmup()
+        self.warmup.add(self.warm_fonts())
+        self.warmup.add(self.atlas.warm())
+        self.warmup.add(self.warm_particles())
+        self.warmup.add(self.sim.prefetch_levels())
         
+    def font(self, size):
+        font = self.fonts.get(size)
+        if font is None:
+            font = self.fonts[size] = pygame.font.Font(None, size)
+        return font
+    
+    font_small = property(lambda self: self.font(24))
+    font_medium = property(lambda self: self.font(36))
+    font_large = property(lambda self: self.font(48))
+    font_huge = property(lambda self: self.font(72))
+    
+    def warm_fonts(self):
+        for size in (24, 36, 48, 72):
+            self.font(size)
+            yield
+    
+    def warm_particles(self):
+        self.particles.warm()
+        yield
+    
     def create_buttons(self):
         button_width, button_height = 200, 50
         center_x = WIDTH // 2 - button_width // 2
         
-        self.play_button = Button(center_x, 200, button_width, button_height, "PLAY", self.font_medium)
-        self.restart_button = Button(center_x, 300, button_width, button_height, "RESTART", self.font_medium)
-        self.quit_button = Button(center_x, 400, button_width, button_height, "QUIT", self.font_medium)
+        self.play_button = Button(center_x, 200, button_width, button_height, "PLAY", self.font_medium, self.text_cache)
+        self.restart_button = Button(center_x, 300, button_width, button_height, "RESTART", self.font_medium, self.text_cache)
+        self.autopilot_button = Button(center_x, 300, button_width, button_height, "AUTOPILOT", self.font_medium, self.text_cache)
+        self.quit_button = Button(center_x, 400, button_width, button_height, "QUIT", self.font_medium, self.text_cache)
     
     def reset_game(self):
-        self.level = 1
-        self.grid_width = GRID_WIDTH
-        self.grid_height = GRID_HEIGHT
-        self.snake = [(self.grid_width // 2, self.grid_height // 2)]
-        self.direction = Direction.RIGHT
-        self.next_direction = Direction.RIGHT
-        self.score = 0
-        self.food = None
-        self.special_food_timer = 0
-        self.walls = []
-        self.place_food()
-        self.game_over = False
+        if self.player:
+            # Restart the replay from the beginning
+            self.player = ReplayPlayer(self.player.replay)
+            self.sim = self.player.sim
+        elif self.record_dir:
+            if self.recorder:
+                self.recorder.finish(self.sim)
+            seed = self.new_seed()
+            self.sim.reset(seed)
+            self.recorder = ReplayRecorder(replay_path(self.record_dir, seed), seed, self.replay_writer,
+                                           self.sim.board_size)
+        else:
+            self.sim.reset(self.new_seed())
+        self.fit_window()
         self.particles.clear()
-        self.move_delay = MOVE_DELAY
-        self.obstacle_snakes = []
-        self.spawn_obstacle_snakes()
-        
-    def place_food(self):
-        while True:
-            pos = (random.randint(0, self.grid_width - 1), random.randint(0, self.grid_height - 1))
-            if pos not in self.snake and pos not in self.walls and all(pos not in obs.body for obs in self.obstacle_snakes):
-                self.food = Food(pos, FoodType.NORMAL)
-                break
-    
-    def load_high_score(self):
+        self.scheduler.reset()
+        self.background = None
+        self.restored = False
+        if self.rewind is not None:
+            self.rewind.clear()
+            self.rewind.push(self.sim)
+        self.warmup.add(self.sim.prefetch_levels())
+    
+    def new_seed(self):
+        # A seed given up front plays the first game; every game gets a fresh
+        # one after that, and the leaderboard records it
+        seed, self.first_seed = self.first_seed, None
+        return seed if seed is not None else random.randrange(1 << 32)
+    
+    def fit_window(self):
+        if self.sim.board_size:
+            size = (WIDTH, HEIGHT)
+            if self.camera is None:
+                self.camera = Camera(WIDTH, HEIGHT - 100)
+        else:
+            size = (self.sim.grid_width * CELL_SIZE, self.sim.grid_height * CELL_SIZE + 100)
+            self.camera = None
+        if self.screen.get_size() != size:
+            self.screen = pygame.display.set_mode(size)
+        self.background = None
+        self.chunks.clear()
+    
+    def play_size(self):
+        # On-screen size of the board area in pixels
+        if self.camera:
+            return self.camera.width, self.camera.height
+        return self.sim.grid_width * CELL_SIZE, self.sim.grid_height * CELL_SIZE
+    
+    def start_replay(self, replay, speed=1.0):
+        self.player = ReplayPlayer(replay)
+        self.replay_speed = speed
+        self.reset_game()
+        self.state = GameState.PLAYING
+    
+    def seek_replay(self, offset):
+        self.player.seek(self.player.sim.tick + offset)
+        self.sim = self.player.sim
+        self.sim.events.clear()
+        self.fit_window()
+        self.particles.clear()
+        self.scheduler.reset()
+    
+    def rewind_game(self, ticks=REWIND_TICKS):
+        if self.rewind is not None and not self.player:
+            sim = self.rewind.rewind(ticks)
+            if sim is not None:
+                self.resume(sim, GameState.PLAYING)
+    
+    def save_game(self):
         try:
-            with open('snake_highscore.json', 'r') as f:
-                data = json.load(f)
-                return data.get('high_score', 0)
-        except:
-            return 0
+            snapshot.save(self.sim)
+        except OSError as e:
+            print(f"Could not save the game to {snapshot.SAVE_PATH}: {e}", file=sys.stderr)
     
-    def save_high_score(self):
+    def load_game(self):
+        if self.record_dir:
+            # The replay being recorded couldn't follow the jump
+            return
         try:
-            with open('snake_highscore.json', 'w') as f:
-                json.dump({'high_score': self.high_score}, f)
-        except:
-            pass
+            sim = snapshot.load()
+        except (OSError, ValueError) as e:
+            print(f"Could not load {snapshot.SAVE_PATH}: {e}", file=sys.stderr)
+            return
+        if self.rewind is not None:
+            self.rewind.clear()
+            self.rewind.push(sim)
+        self.resume(sim, GameState.PAUSED)
+    
+    def resume(self, sim, state):
+        # Carry on from a restored simulation
+        self.sim = sim
+        self.restored = True
+        self.state = state
+        if self.autopilot:
+            # Its caches describe the board it was steering on
+            self.set_autopilot(True)
+        self.fit_window()
+        self.particles.clear()
+        self.scheduler.reset()
+    
+    def set_autopilot(self, enabled):
+        self.autopilot = Autopilot() if enabled else None
+    
+    def set_profile_overlay(self, enabled):
+        self.show_profile = enabled
+        self.profiler.enabled = enabled or self.profiler.trace
+        self.profile_lines = []
+    
+    def tick(self):
+        if self.autopilot:
+            direction = self.autopilot(self.sim)
+            if direction is not None:
+                self.sim.set_direction(direction)
+        self.sim.step()
+        if self.recorder:
+            self.recorder.record(self.sim)
+        if self.rewind is not None:
+            self.rewind.push(self.sim)
     
     def add_particle_explosion(self, x, y, color, count=10):
         screen_x = x * CELL_SIZE + CELL_SIZE // 2
         screen_y = y * CELL_SIZE + CELL_SIZE // 2
         
-        for _ in range(count):
-            angle = random.uniform(0, 2 * math.pi)
-            speed = random.uniform(50, 150)
-            velocity = (math.cos(angle) * speed, math.sin(angle) * speed)
-            lifetime = random.uniform(500, 1000)
-            self.particles.append(Particle(screen_x, screen_y, color, velocity, lifetime))
+        self.particles.emit(screen_x, screen_y, color, count)
     
     def handle_events(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                self.save_high_score()
                 return False
             
             elif event.type == pygame.KEYDOWN:
-                if self.state == GameState.PLAYING:
-                    if event.key == pygame.K_UP and self.direction != Direction.DOWN:
-                        self.next_direction = Direction.UP
-                    elif event.key == pygame.K_DOWN and self.direction != Direction.UP:
-                        self.next_direction = Direction.DOWN
-                    elif event.key == pygame.K_LEFT and self.direction != Direction.RIGHT:
-                        self.next_direction = Direction.LEFT
-                    elif event.key == pygame.K_RIGHT and self.direction != Direction.LEFT:
-                        self.next_direction = Direction.RIGHT
+                if event.key == pygame.K_F3:
+                    self.set_profile_overlay(not self.show_profile)
+                
+                elif self.state == GameState.PLAYING and self.player:
+                    # Watching a replay: arrows seek instead of steering
+                    if event.key == pygame.K_LEFT:
+                        self.seek_replay(-100)
+                    elif event.key == pygame.K_RIGHT:
+                        self.seek_replay(100)
+                    elif event.key == pygame.K_SPACE:
+                        self.state = GameState.PAUSED
+                
+                elif self.state == GameState.PLAYING:
+                    if event.key == pygame.K_UP:
+                        self.sim.set_direction(Direction.UP)
+                    elif event.key == pygame.K_DOWN:
+                        self.sim.set_direction(Direction.DOWN)
+                    elif event.key == pygame.K_LEFT:
+                        self.sim.set_direction(Direction.LEFT)
+                    elif event.key == pygame.K_RIGHT:
+                        self.sim.set_direction(Direction.RIGHT)
                     elif event.key == pygame.K_SPACE:
                         self.state = GameState.PAUSED
+                    elif event.key == pygame.K_a:
+                        self.set_autopilot(self.autopilot is None)
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.rewind_game()
+                    elif event.key == pygame.K_F5:
+                        self.save_game()
+                    elif event.key == pygame.K_F9:
+                        self.load_game()
                 
                 elif self.state == GameState.PAUSED:
                     if event.key == pygame.K_SPACE:
                         self.state = GameState.PLAYING
+                    elif event.key == pygame.K_F5 and not self.player:
+                        self.save_game()
                 
                 elif self.state == GameState.GAME_OVER:
                     if event.key == pygame.K_r:
@@ -295,14 +724,30 @@ class SnakeGame:
                         self.state = GameState.PLAYING
                     elif event.key == pygame.K_m:
                         self.state = GameState.MENU
+                    elif event.key == pygame.K_BACKSPACE:
+                        self.rewind_game()
                 
                 elif self.state == GameState.MENU:
                     if event.key == pygame.K_RETURN:
+                        self.set_autopilot(False)
                         self.reset_game()
                         self.state = GameState.PLAYING
+                    elif event.key == pygame.K_a:
+                        self.set_autopilot(True)
+                        self.reset_game()
+                        self.state = GameState.PLAYING
+                    elif event.key == pygame.K_F9:
+                        self.set_autopilot(False)
+                        self.load_game()
             
             # Handle button clicks
             if self.play_button.handle_event(event) and self.state == GameState.MENU:
+                self.set_autopilot(False)
+                self.reset_game()
+                self.state = GameState.PLAYING
+            
+            if self.autopilot_button.handle_event(event) and self.state == GameState.MENU:
+                self.set_autopilot(True)
                 self.reset_game()
                 self.state = GameState.PLAYING
             
@@ -311,7 +756,6 @@ class SnakeGame:
                 self.state = GameState.PLAYING
             
             if self.quit_button.handle_event(event):
-                self.save_high_score()
                 return False
         
         return True
@@ -321,187 +765,261 @@ class SnakeGame:
             return
         
         # Update food animation
-        if self.food:
-            self.food.update(dt)
+        if self.sim.food:
+            self.food_sprite.update(dt)
         
-        # Move snake
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_move >= self.move_delay:
-            self.last_move = current_time
-            self.move_snake()
+        # Advance the simulation in whole ticks; turbo runs one tick per frame
+        # regardless of wall-clock time
+        step = self.tick
+        sim_dt = self.sim.move_delay if self.turbo else dt
+        if self.player:
+            step = self.player.step
+            sim_dt *= self.replay_speed
+        if self.scheduler.advance(self.sim, sim_dt, step):
+            self.handle_sim_events()
         
         # Update particles
-        for particle in self.particles[:]:
-            particle.update(dt)
-            if not particle.is_alive():
-                self.particles.remove(particle)
-        
-        # Move obstacle snakes
-        for obs in self.obstacle_snakes:
-            obs.last_move += dt
-            if obs.last_move > obs.move_delay:
-                obs.move(self.grid_width, self.grid_height, self.walls, self.snake)
-                obs.last_move = 0
-    
-    def move_snake(self):
-        self.direction = self.next_direction
-        dx, dy = self.direction.value
-        head = (self.snake[0][0] + dx, self.snake[0][1] + dy)
-        
-        # Check collisions
-        if (head[0] < 0 or head[0] >= self.grid_width or
-            head[1] < 0 or head[1] >= self.grid_height or
-            head in self.snake or head in self.walls):
-            self.game_over = True
-            self.state = GameState.GAME_OVER
-            
-            # Update high score
-            if self.score > self.high_score:
-                self.high_score = self.score
-                self.save_high_score()
-            
-            # Explosion effect
-            self.add_particle_explosion(self.snake[0][0], self.snake[0][1], COLORS['snake_head'], 20)
-            return
-        
-        # Check collision with obstacle snakes
-        for obs in self.obstacle_snakes:
-            if head in obs.body:
-                self.game_over = True
-                self.state = GameState.GAME_OVER
-                return
-        
-        self.snake.insert(0, head)
+        self.particles.update(dt)
+    
+    def handle_sim_events(self):
+        for event in self.sim.drain_events():
+            kind = event[0]
+            if kind == 'eat':
+                self.add_particle_explosion(event[1][0], event[1][1], COLORS['food'], 8)
+            elif kind == 'death':
+                self.end_game()
+                # Explosion effect
+                self.add_particle_explosion(event[1][0], event[1][1], COLORS['snake_head'], 20)
+            elif kind == 'win':
+                self.end_game()
+            elif kind == 'level_up':
+                # New walls were added
+                self.background = None
+            elif kind == 'resize':
+                self.fit_window()
+            elif kind == 'power':
+                self.add_particle_explosion(event[2][0], event[2][1], COLORS[event[1]], 12)
+                if event[1] == 'shrink':
+                    # Dropped tail cells aren't in the dirty set: redraw everything
+                    self.drawn = None
+    
+    def end_game(self):
+        self.state = GameState.GAME_OVER
         
-        # Check food collision
-        if self.food and head == self.food.pos:
-            self.score += 1
-            self.add_particle_explosion(head[0], head[1], COLORS['food'], 8)
-            
-            # Increase speed slightly
-            self.move_delay = max(60, self.move_delay - 2)
-            
-            self.place_food()
-            
-            # Level up every 5 points
-            if self.score % 5 == 0:
-                self.level_up()
-        else:
-            self.snake.pop()
+        # Replays, autopilot and restored games don't go on the leaderboard
+        self.rank = None
+        if self.player or self.autopilot or self.restored or self.sim.score == 0:
+            return
+        self.rank = self.scores.submit(self.player_name, self.sim.score, self.sim.level, self.sim.seed)
+        self.high_score = self.scores.best
     
-    def draw_grid(self):
-        for x in range(self.grid_width + 1):
-            pygame.draw.line(self.screen, COLORS['grid'], 
-                           (x * CELL_SIZE, 0), (x * CELL_SIZE, self.grid_height * CELL_SIZE))
-        for y in range(self.grid_height + 1):
-            pygame.draw.line(self.screen, COLORS['grid'], 
-                           (0, y * CELL_SIZE), (self.grid_width * CELL_SIZE, y * CELL_SIZE))
+    def build_background(self):
+        width, height = self.sim.grid_width * CELL_SIZE, self.sim.grid_height * CELL_SIZE
+        background = pygame.Surface((width + 1, height + 1)).convert()
+        background.fill(COLORS['bg'])
+        for x in range(self.sim.grid_width + 1):
+            pygame.draw.line(background, COLORS['grid'], (x * CELL_SIZE, 0), (x * CELL_SIZE, height))
+        for y in range(self.sim.grid_height + 1):
+            pygame.draw.line(background, COLORS['grid'], (0, y * CELL_SIZE), (width, y * CELL_SIZE))
         
         # Draw walls
-        for wall in self.walls:
+        for wall in self.sim.walls:
             x, y = wall[0] * CELL_SIZE, wall[1] * CELL_SIZE
-            pygame.draw.rect(self.screen, COLORS['wall'], (x+2, y+2, CELL_SIZE-4, CELL_SIZE-4))
+            pygame.draw.rect(background, COLORS['wall'], (x+2, y+2, CELL_SIZE-4, CELL_SIZE-4))
+        return background
+    
+    def draw_grid(self):
+        if self.background is None:
+            self.background = self.build_background()
+        self.screen.blit(self.background, (0, 0))
+        self.draw_calls += 1
     
     def draw_snake(self):
-        for i, pos in enumerate(self.snake):
-            x, y = pos[0] * CELL_SIZE, pos[1] * CELL_SIZE
-            
-            if i == 0:  # Head
-                color = COLORS['snake_head']
-                # Draw head with eyes
-                pygame.draw.rect(self.screen, color, (x + 2, y + 2, CELL_SIZE - 4, CELL_SIZE - 4))
-                
-                # Eyes based on direction
-                eye_size = 3
-                if self.direction == Direction.UP:
-                    eye1_pos = (x + 6, y + 8)
-                    eye2_pos = (x + CELL_SIZE - 9, y + 8)
-                elif self.direction == Direction.DOWN:
-                    eye1_pos = (x + 6, y + CELL_SIZE - 11)
-                    eye2_pos = (x + CELL_SIZE - 9, y + CELL_SIZE - 11)
-                elif self.direction == Direction.LEFT:
-                    eye1_pos = (x + 8, y + 6)
-                    eye2_pos = (x + 8, y + CELL_SIZE - 9)
-                else:  # RIGHT
-                    eye1_pos = (x + CELL_SIZE - 11, y + 6)
-                    eye2_pos = (x + CELL_SIZE - 11, y + CELL_SIZE - 9)
-                
-                pygame.draw.circle(self.screen, COLORS['text'], eye1_pos, eye_size)
-                pygame.draw.circle(self.screen, COLORS['text'], eye2_pos, eye_size)
-                
-            elif i == len(self.snake) - 1:  # Tail
-                color = COLORS['snake_tail']
-                pygame.draw.rect(self.screen, color, (x + 3, y + 3, CELL_SIZE - 6, CELL_SIZE - 6))
-            else:  # Body
-                color = COLORS['snake_body']
-                pygame.draw.rect(self.screen, color, (x + 1, y + 1, CELL_SIZE - 2, CELL_SIZE - 2))
+        atlas = self.atlas
+        snake = self.sim.snake
+        last = len(snake) - 1
+        positions = [(pos[0] * CELL_SIZE, pos[1] * CELL_SIZE) for pos in snake]
+        if self.smooth and self.state == GameState.PLAYING and last > 0:
+            # Render one tick behind, sliding the head out of the neck cell and
+            # the tail out of the cell it just vacated
+            alpha = self.scheduler.alpha(self.sim)
+            positions[0] = self.lerp_cell(snake[1], snake[0], alpha)
+            if self.sim.last_tail:
+                positions[last] = self.lerp_cell(self.sim.last_tail, snake[last], alpha)
+        # Tail first so the head ends up on top when interpolated sprites overlap
+        blits = [(atlas.segment(self.sim.direction, i == 0, i == last), positions[i])
+                 for i in range(last, -1, -1)]
         
         # Draw obstacle snakes
-        for obs in self.obstacle_snakes:
-            obs.draw(self.screen)
+        for obs in self.sim.obstacle_snakes:
+            for i, pos in enumerate(obs.body):
+                sprite = atlas.obstacle_head if i == 0 else atlas.obstacle_body
+                blits.append((sprite, (pos[0] * CELL_SIZE, pos[1] * CELL_SIZE)))
+        self.screen.blits(blits, False)
+        self.draw_calls += len(blits)
+    
+    def draw_world(self):
+        # Large-board rendering: background tiles, then whatever occupies the
+        # cells in view. Cost depends on the viewport, not the board or snake
+        # size. Returns the particle rects drawn.
+        sim = self.sim
+        camera = self.camera
+        snake = sim.snake
+        head = (snake[0][0] * CELL_SIZE, snake[0][1] * CELL_SIZE)
+        if self.smooth and self.state == GameState.PLAYING and len(snake) > 1:
+            # Segments snap from cell to cell, but the camera glides
+            head = self.lerp_cell(snake[1], snake[0], self.scheduler.alpha(sim))
+        camera.follow((head[0] + CELL_SIZE // 2, head[1] + CELL_SIZE // 2),
+                      sim.grid_width * CELL_SIZE, sim.grid_height * CELL_SIZE)
+        ox, oy = camera.x, camera.y
+        self.screen.set_clip(pygame.Rect(0, 0, camera.width, camera.height))
+        
+        self.chunks.sync(sim)
+        span = ChunkCache.CHUNK * CELL_SIZE
+        blits = []
+        for cy in range(oy // span, min((oy + camera.height - 1) // span + 1, -(-sim.grid_height // ChunkCache.CHUNK))):
+            for cx in range(ox // span, min((ox + camera.width - 1) // span + 1, -(-sim.grid_width // ChunkCache.CHUNK))):
+                blits.append((self.chunks.get(sim, cx, cy), (cx * span - ox, cy * span - oy)))
+        
+        # Snake cells in view, straight from the occupancy grid
+        board = sim.board
+        layer = board.layers[board.SNAKE]
+        x0, y0 = ox // CELL_SIZE, oy // CELL_SIZE
+        x1 = min(sim.grid_width, (ox + camera.width - 1) // CELL_SIZE + 1)
+        y1 = min(sim.grid_height, (oy + camera.height - 1) // CELL_SIZE + 1)
+        head, tail = snake[0], snake[-1]
+        has_tail = len(snake) > 1
+        for y in range(y0, y1):
+            row = y * board.width
+            for x in range(x0, x1):
+                if layer[row + x]:
+                    pos = (x, y)
+                    sprite = self.atlas.segment(sim.direction, pos == head, has_tail and pos == tail)
+                    blits.append((sprite, (x * CELL_SIZE - ox, y * CELL_SIZE - oy)))
+        
+        for obs in sim.obstacle_snakes:
+            for i, (x, y) in enumerate(obs.body):
+                if x0 <= x < x1 and y0 <= y < y1:
+                    sprite = self.atlas.obstacle_head if i == 0 else self.atlas.obstacle_body
+                    blits.append((sprite, (x * CELL_SIZE - ox, y * CELL_SIZE - oy)))
+        
+        food = sim.food
+        if food and x0 <= food.pos[0] < x1 and y0 <= food.pos[1] < y1:
+            sprite = self.atlas.food_frame(food.type, self.food_sprite.animation_time)
+            blits.append((sprite, (food.pos[0] * CELL_SIZE - ox, food.pos[1] * CELL_SIZE - oy)))
+        
+        for (x, y), item in sim.items.items():
+            if x0 <= x < x1 and y0 <= y < y1:
+                blits.append((self.atlas.items[item.kind], (x * CELL_SIZE - ox, y * CELL_SIZE - oy)))
+        
+        self.screen.blits(blits, False)
+        particle_rects = self.particles.draw(self.screen, (ox, oy))
+        self.screen.set_clip(None)
+        self.draw_calls += len(blits) + len(particle_rects)
+        return particle_rects
+    
+    def lerp_cell(self, start, end, alpha):
+        return (int((start[0] + (end[0] - start[0]) * alpha) * CELL_SIZE),
+                int((start[1] + (end[1] - start[1]) * alpha) * CELL_SIZE))
+    
+    def draw_segment(self, pos, is_head, is_tail):
+        sprite = self.atlas.segment(self.sim.direction, is_head, is_tail)
+        self.screen.blit(sprite, (pos[0] * CELL_SIZE, pos[1] * CELL_SIZE))
+        self.draw_calls += 1
+    
+    def draw_obstacle_segment(self, pos, is_head):
+        sprite = self.atlas.obstacle_head if is_head else self.atlas.obstacle_body
+        self.screen.blit(sprite, (pos[0] * CELL_SIZE, pos[1] * CELL_SIZE))
+        self.draw_calls += 1
+    
+    def draw_food(self):
+        food = self.sim.food
+        sprite = self.atlas.food_frame(food.type, self.food_sprite.animation_time)
+        self.screen.blit(sprite, (food.pos[0] * CELL_SIZE, food.pos[1] * CELL_SIZE))
+        self.draw_calls += 1
+    
+    def draw_items(self):
+        sprites = self.atlas.items
+        blits = [(sprites[item.kind], (x * CELL_SIZE, y * CELL_SIZE)) for (x, y), item in self.sim.items.items()]
+        self.screen.blits(blits, False)
+        self.draw_calls += len(blits)
+    
+    def power_text(self):
+        # Ticks left on each active power-up
+        sim = self.sim
+        powers = [(name, until - sim.tick) for name, until in (("Slow", sim.slow_until), ("Ghost", sim.ghost_until))
+                  if until > sim.tick]
+        return "   ".join(f"{name} {left}" for name, left in powers)
     
     def draw_ui(self):
         # UI background
-        ui_rect = pygame.Rect(0, self.grid_height * CELL_SIZE, self.grid_width * CELL_SIZE, 100)
+        width, height = self.play_size()
+        ui_rect = pygame.Rect(0, height, width, 100)
         pygame.draw.rect(self.screen, COLORS['ui_bg'], ui_rect)
-        pygame.draw.line(self.screen, COLORS['grid'], (0, self.grid_height * CELL_SIZE), (self.grid_width * CELL_SIZE, self.grid_height * CELL_SIZE), 2)
+        pygame.draw.line(self.screen, COLORS['grid'], (0, height), (width, height), 2)
         
         # Score
-        score_text = self.font_medium.render(f"Score: {self.score}", True, COLORS['text'])
-        self.screen.blit(score_text, (10, self.grid_height * CELL_SIZE + 10))
+        score_text = self.text_cache.render(self.font_medium, f"Score: {self.sim.score}", COLORS['text'])
+        self.screen.blit(score_text, (10, height + 10))
         
         # High Score
-        high_score_text = self.font_medium.render(f"High Score: {self.high_score}", True, COLORS['text'])
-        self.screen.blit(high_score_text, (10, self.grid_height * CELL_SIZE + 40))
+        high_score_text = self.text_cache.render(self.font_medium, f"High Score: {self.high_score}", COLORS['text'])
+        self.screen.blit(high_score_text, (10, height + 40))
+        
+        # Active power-ups
+        power_text = self.power_text()
+        if power_text:
+            self.screen.blit(self.text_cache.render(self.font_small, power_text, COLORS['ghost']), (10, height + 72))
         
         # Level
-        level_text = self.font_medium.render(f"Level: {self.level}", True, COLORS['special_food'])
-        self.screen.blit(level_text, (self.grid_width * CELL_SIZE - 180, self.grid_height * CELL_SIZE + 10))
+        level_text = self.text_cache.render(self.font_medium, f"Level: {self.sim.level}", COLORS['special_food'])
+        self.screen.blit(level_text, (width - 180, height + 10))
         
         # Speed indicator
-        speed_text = self.font_small.render(f"Speed: {int((MOVE_DELAY - self.move_delay + 60) / 10)}", True, COLORS['text'])
-        self.screen.blit(speed_text, (self.grid_width * CELL_SIZE - 180, self.grid_height * CELL_SIZE + 40))
+        speed_text = self.text_cache.render(self.font_small, f"Speed: {int((MOVE_DELAY - self.sim.move_delay + 60) / 10)}", COLORS['text'])
+        self.screen.blit(speed_text, (width - 180, height + 40))
         
         # Length
-        length_text = self.font_small.render(f"Length: {len(self.snake)}", True, COLORS['text'])
-        self.screen.blit(length_text, (self.grid_width * CELL_SIZE - 180, self.grid_height * CELL_SIZE + 60))
+        length_text = self.text_cache.render(self.font_small, f"Length: {len(self.sim.snake)}", COLORS['text'])
+        self.screen.blit(length_text, (width - 180, height + 60))
         
         # Controls
         if self.state == GameState.PLAYING:
-            controls_text = self.font_small.render("SPACE: Pause", True, COLORS['text'])
-            self.screen.blit(controls_text, (self.grid_width * CELL_SIZE - 180, self.grid_height * CELL_SIZE + 80))
+            controls_text = self.text_cache.render(self.font_small, "SPACE: Pause", COLORS['text'])
+            self.screen.blit(controls_text, (width - 180, height + 80))
     
     def draw_menu(self):
         # Title
-        title_text = self.font_huge.render("SNAKE", True, COLORS['text'])
+        title_text = self.text_cache.render(self.font_huge, "SNAKE", COLORS['text'])
         title_rect = title_text.get_rect(center=(WIDTH // 2, 100))
         self.screen.blit(title_text, title_rect)
         
         # Subtitle
-        subtitle_text = self.font_medium.render("Enhanced Edition", True, COLORS['snake_head'])
+        subtitle_text = self.text_cache.render(self.font_medium, "Enhanced Edition", COLORS['snake_head'])
         subtitle_rect = subtitle_text.get_rect(center=(WIDTH // 2, 150))
         self.screen.blit(subtitle_text, subtitle_rect)
         
         # High score
         if self.high_score > 0:
-            high_score_text = self.font_medium.render(f"High Score: {self.high_score}", True, COLORS['text'])
+            high_score_text = self.text_cache.render(self.font_medium, f"High Score: {self.high_score}", COLORS['text'])
             high_score_rect = high_score_text.get_rect(center=(WIDTH // 2, 500))
             self.screen.blit(high_score_text, high_score_rect)
         
         # Controls
         controls = [
             "Arrow Keys: Move",
-            "Space: Pause",
-            "Enter: Quick Start"
+            "Space: Pause   A: Autopilot   Backspace: Rewind",
+            "Enter: Quick Start   F3: Stats   F5/F9: Save/Load"
         ]
         
         for i, control in enumerate(controls):
-            control_text = self.font_small.render(control, True, COLORS['text'])
+            control_text = self.text_cache.render(self.font_small, control, COLORS['text'])
             control_rect = control_text.get_rect(center=(WIDTH // 2, 550 + i * 25))
             self.screen.blit(control_text, control_rect)
         
         # Buttons
         self.play_button.draw(self.screen)
+        self.autopilot_button.draw(self.screen)
         self.quit_button.draw(self.screen)
     
     def draw_pause(self):
@@ -512,12 +1030,12 @@ class SnakeGame:
         self.screen.blit(overlay, (0, 0))
         
         # Pause text
-        pause_text = self.font_huge.render("PAUSED", True, COLORS['text'])
+        pause_text = self.text_cache.render(self.font_huge, "PAUSED", COLORS['text'])
         pause_rect = pause_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 50))
         self.screen.blit(pause_text, pause_rect)
         
         # Instructions
-        continue_text = self.font_medium.render("Press SPACE to continue", True, COLORS['text'])
+        continue_text = self.text_cache.render(self.font_medium, "Press SPACE to continue", COLORS['text'])
         continue_rect = continue_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 20))
         self.screen.blit(continue_text, continue_rect)
     
@@ -529,23 +1047,30 @@ class SnakeGame:
         self.screen.blit(overlay, (0, 0))
         
         # Game over text
-        game_over_text = self.font_huge.render("GAME OVER", True, COLORS['food'])
+        if self.sim.won:
+            game_over_text = self.text_cache.render(self.font_huge, "YOU WIN!", COLORS['special_food'])
+        else:
+            game_over_text = self.text_cache.render(self.font_huge, "GAME OVER", COLORS['food'])
         game_over_rect = game_over_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100))
         self.screen.blit(game_over_text, game_over_rect)
         
         # Final score
-        final_score_text = self.font_large.render(f"Final Score: {self.score}", True, COLORS['text'])
+        final_score_text = self.text_cache.render(self.font_large, f"Final Score: {self.sim.score}", COLORS['text'])
         final_score_rect = final_score_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 30))
         self.screen.blit(final_score_text, final_score_rect)
         
         # High score achievement
-        if self.score == self.high_score and self.score > 0:
-            new_record_text = self.font_medium.render("NEW HIGH SCORE!", True, COLORS['special_food'])
+        if self.rank == 1 and self.sim.score == self.high_score:
+            new_record_text = self.text_cache.render(self.font_medium, "NEW HIGH SCORE!", COLORS['special_food'])
             new_record_rect = new_record_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 10))
             self.screen.blit(new_record_text, new_record_rect)
+        elif self.rank:
+            rank_text = self.text_cache.render(self.font_medium, f"Leaderboard #{self.rank}", COLORS['special_food'])
+            rank_rect = rank_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 10))
+            self.screen.blit(rank_text, rank_rect)
         
         # Instructions
-        restart_text = self.font_medium.render("R: Restart    M: Menu", True, COLORS['text'])
+        restart_text = self.text_cache.render(self.font_medium, "R: Restart    M: Menu", COLORS['text'])
         restart_rect = restart_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 + 60))
         self.screen.blit(restart_text, restart_rect)
         
@@ -553,81 +1078,283 @@ class SnakeGame:
         self.restart_button.draw(self.screen)
     
     def draw(self):
+        # Draw calls are sprite, tile and particle blits plus text labels
+        self.draw_calls = 0
+        text_lookups = self.text_cache.hits + self.text_cache.misses
+        profiler = self.profiler
+        
+        if self.dirty_rects and self.state == GameState.PLAYING and self.can_draw_dirty():
+            with profiler.section('draw_dirty'):
+                self.draw_dirty()
+            self.draw_calls += self.text_cache.hits + self.text_cache.misses - text_lookups
+            return
+        
         self.screen.fill(COLORS['bg'])
         
         if self.state == GameState.MENU:
-            self.draw_menu()
+            with profiler.section('draw_menu'):
+                self.draw_menu()
         
         elif self.state in [GameState.PLAYING, GameState.PAUSED, GameState.GAME_OVER]:
             # Draw game elements
-            self.draw_grid()
-            self.draw_snake()
-            
-            # Draw food
-            if self.food:
-                self.food.draw(self.screen)
-            
-            # Draw particles
-            for particle in self.particles:
-                particle.draw(self.screen)
+            if self.camera:
+                with profiler.section('draw_world'):
+                    particle_rects = self.draw_world()
+            else:
+                with profiler.section('draw_grid'):
+                    self.draw_grid()
+                with profiler.section('draw_snake'):
+                    self.draw_snake()
+                
+                # Draw food
+                if self.sim.food:
+                    with profiler.section('draw_food'):
+                        self.draw_food()
+                
+                if self.sim.items:
+                    with profiler.section('draw_items'):
+                        self.draw_items()
+                
+                # Draw particles
+                with profiler.section('draw_particles'):
+                    particle_rects = self.particles.draw(self.screen)
+                self.draw_calls += len(particle_rects)
             
-            self.draw_ui()
+            with profiler.section('draw_ui'):
+                self.draw_ui()
             
             # Draw overlays
             if self.state == GameState.PAUSED:
-                self.draw_pause()
+                with profiler.section('draw_pause'):
+                    self.draw_pause()
             elif self.state == GameState.GAME_OVER:
-                self.draw_game_over()
+                with profiler.section('draw_game_over'):
+                    self.draw_game_over()
+            
+            if self.dirty_rects:
+                self.remember_frame(particle_rects)
+        
+        self.draw_calls += self.text_cache.hits + self.text_cache.misses - text_lookups
+        if self.show_profile:
+            self.draw_profile()
         
-        pygame.display.flip()
+        with profiler.section('display.flip'):
+            pygame.display.flip()
     
-    def run(self):
+    def draw_profile(self):
+        # Stats text is refreshed a few times a second so it stays readable
+        # and the text cache isn't flooded with one-off labels
+        if not self.profile_lines or self.profiler.frame_count % 30 == 0:
+            p50, p95, p99 = self.profiler.percentiles(50, 95, 99)
+            counters = self.profiler.counters
+            self.profile_lines = [
+                ("frame p50 / p95 / p99", f"{p50:.1f} / {p95:.1f} / {p99:.1f} ms"),
+                ("particles", str(counters.get('particles', 0))),
+                ("snake length", str(counters.get('snake_length', 0))),
+                ("draw calls", str(counters.get('draw_calls', 0))),
+            ] + [("  " * depth + name, f"{ms:.2f} ms") for name, depth, ms in self.profiler.breakdown()]
+        
+        line_height = 18
+        width = 300
+        panel = pygame.Surface((width, line_height * len(self.profile_lines) + 8))
+        panel.set_alpha(180)
+        panel.fill((0, 0, 0))
+        self.screen.blit(panel, (4, 4))
+        for i, (label, value) in enumerate(self.profile_lines):
+            y = 8 + i * line_height
+            self.screen.blit(self.text_cache.render(self.font_small, label, COLORS['text']), (8, y))
+            value_text = self.text_cache.render(self.font_small, value, COLORS['text'])
+            self.screen.blit(value_text, (width - value_text.get_width(), y))
+    
+    def hud_key(self):
+        return (self.sim.score, self.high_score, self.sim.level, self.sim.move_delay, len(self.sim.snake),
+                self.power_text())
+    
+    def remember_frame(self, particle_rects):
+        # What the last full or dirty frame put on screen, to diff the next one against
+        self.drawn = {
+            'state': self.state,
+            'background': self.background,
+            'tick': self.sim.tick,
+            'cells': {self.sim.snake[0], self.sim.snake[-1]} |
+                     {pos for obs in self.sim.obstacle_snakes for pos in obs.body} |
+                     ({self.sim.food.pos} if self.sim.food else set()) |
+                     self.sim.items.keys(),
+            'particles': particle_rects,
+            'hud': self.hud_key(),
+        }
+    
+    def can_draw_dirty(self):
+        # Anything beyond a single snake move (state change, new walls, resize,
+        # catch-up ticks) needs a full redraw
+        return (not self.smooth and
+                not self.show_profile and
+                self.camera is None and
+                self.drawn is not None and
+                self.drawn['state'] == self.state and
+                self.drawn['background'] is self.background and
+                self.background is not None and
+                self.sim.tick - self.drawn['tick'] <= 1)
+    
+    def redraw_cell(self, pos):
+        rect = pygame.Rect(pos[0] * CELL_SIZE, pos[1] * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+        self.screen.blit(self.background, rect, rect)
+        board = self.sim.board
+        if board.in_bounds(pos):
+            if board.has(board.SNAKE, pos):
+                self.draw_segment(pos, pos == self.sim.snake[0], pos == self.sim.snake[-1] and len(self.sim.snake) > 1)
+            if board.has(board.OBSTACLE, pos):
+                self.draw_obstacle_segment(pos, any(obs.body[0] == pos for obs in self.sim.obstacle_snakes))
+        if self.sim.food and self.sim.food.pos == pos:
+            self.draw_food()
+        item = self.sim.items.get(pos)
+        if item is not None:
+            self.screen.blit(self.atlas.items[item.kind], rect)
+            self.draw_calls += 1
+        return rect
+    
+    def draw_dirty(self):
+        play_area = pygame.Rect(0, 0, self.sim.grid_width * CELL_SIZE, self.sim.grid_height * CELL_SIZE)
+        previous = self.drawn
+        self.remember_frame([])
+        cells = previous['cells'] | self.drawn['cells']
+        
+        # Erase last frame's particles, picking up any cells they covered
+        rects = []
+        for rect in previous['particles']:
+            rect = rect.clip(play_area)
+            if not rect.width or not rect.height:
+                continue
+            for cx in range(rect.left // CELL_SIZE, (rect.right - 1) // CELL_SIZE + 1):
+                for cy in range(rect.top // CELL_SIZE, (rect.bottom - 1) // CELL_SIZE + 1):
+                    cells.add((cx, cy))
+            rects.append(rect)
+        
+        for pos in cells:
+            rects.append(self.redraw_cell(pos))
+        
+        # Particles stay inside the board so they never smear the HUD
+        self.screen.set_clip(play_area)
+        for rect in self.particles.draw(self.screen):
+            rect = rect.clip(play_area)
+            self.drawn['particles'].append(rect)
+            rects.append(rect)
+        self.screen.set_clip(None)
+        
+        if self.drawn['hud'] != previous['hud']:
+            self.draw_ui()
+            rects.append(pygame.Rect(0, play_area.bottom, play_area.width, 100))
+        
+        self.draw_calls += len(rects)
+        with self.profiler.section('display.update'):
+            pygame.display.update(rects)
+    
+    def finish_startup(self):
+        # Called after each frame until startup is over: the first frame is
+        # up, and the warmup has used its per-frame slices
+        if not self.startup.has('first frame'):
+            self.startup.mark('first frame')
+        elif self.warmup.run():
+            if self.report_startup:
+                print(self.startup.report(), file=sys.stderr)
+                print(f"Warmup: {self.warmup.busy * 1000:.1f} ms spread over {self.warmup.frames} frames",
+                      file=sys.stderr)
+            self.startup = None
+    
+    def run(self, fps=FPS, render=True, turbo=False):
+        # fps=0 leaves rendering uncapped; turbo steps the simulation as fast as
+        # the loop spins, for soak tests
         running = True
         dt = 0
+        self.turbo = turbo
+        
+        profiler = self.profiler
         
         while running:
-            dt = self.clock.tick(FPS)
+            dt = self.clock.tick(fps)
+            profiler.begin_frame()
+            
+            with profiler.section('handle_events'):
+                running = self.handle_events()
+            with profiler.section('update_game'):
+                self.update_game(dt)
+            if render:
+                with profiler.section('draw'):
+                    self.draw()
+            if self.startup:
+                self.finish_startup()
+            elif self.warmup.jobs:
+                with profiler.section('warmup'):
+                    self.warmup.run()
             
-            running = self.handle_events()
-            self.update_game(dt)
-            self.draw()
+            profiler.end_frame(particles=len(self.particles), snake_length=len(self.sim.snake),
+                               draw_calls=self.draw_calls)
         
+        if self.report_cache_stats:
+            print(f"Text cache: {self.text_cache.stats()}")
+        if self.recorder:
+            self.recorder.finish(self.sim)
+        if self.replay_writer:
+            self.replay_writer.close()
+        self.scores.close()
+        if self.trace_path:
+            self.profiler.export(self.trace_path)
         pygame.quit()
         sys.exit()
 
-    def spawn_obstacle_snakes(self):
-        self.obstacle_snakes = []
-        if self.level >= 5:
-            for i in range(min((self.level - 4), 3)):
-                # Place obstacle snake at random location
-                while True:
-                    pos = (random.randint(0, self.grid_width - 1), random.randint(0, self.grid_height - 1))
-                    if pos not in self.snake and pos not in self.walls:
-                        break
-                direction = random.choice(list(Direction))
-                body = [pos]
-                self.obstacle_snakes.append(ObstacleSnake(body, direction))
-
-    def level_up(self):
-        if self.level < self.max_level:
-            self.level += 1
-            # Increase grid size every 3 levels, up to a max
-            if self.level % 3 == 0 and self.grid_width < 40 and self.grid_height < 30:
-                self.grid_width += 2
-                self.grid_height += 2
-                self.screen = pygame.display.set_mode((self.grid_width * CELL_SIZE, self.grid_height * CELL_SIZE + 100))
-            # Increase speed
-            self.move_delay = max(40, self.move_delay - 8)
-            # Add more walls
-            for _ in range(self.level // 2):
-                while True:
-                    pos = (random.randint(0, self.grid_width - 1), random.randint(0, self.grid_height - 1))
-                    if pos not in self.snake and pos not in self.walls and (self.food is None or pos != self.food.pos):
-                        self.walls.append(pos)
-                        break
-            # Add more obstacle snakes
-            self.spawn_obstacle_snakes()
+def parse_board_size(text):
+    try:
+        width, height = (int(n) for n in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {text!r}")
+    if width < GRID_WIDTH or height < GRID_HEIGHT:
+        raise argparse.ArgumentTypeError(f"board must be at least {GRID_WIDTH}x{GRID_HEIGHT}")
+    return width, height
 
 if __name__ == '__main__':
-    game = SnakeGame()
-    game.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Enhanced Snake Game')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='only redraw and push changed screen regions while playing')
+    parser.add_argument('--cache-stats', action='store_true',
+                        help='print text cache hit rates on exit')
+    parser.add_argument('--fps', type=int, default=FPS, help='render rate cap (0 = uncapped)')
+    parser.add_argument('--smooth', action='store_true',
+                        help='interpolate snake movement between simulation ticks')
+    parser.add_argument('--no-render', action='store_true', help='run the game loop without drawing')
+    parser.add_argument('--turbo', action='store_true',
+                        help='advance one simulation tick per loop iteration, as fast as possible')
+    parser.add_argument('--record', metavar='DIR', help='record every game as a replay file in DIR')
+    parser.add_argument('--replay', metavar='FILE', help='watch a recorded replay (arrows seek)')
+    parser.add_argument('--replay-speed', type=float, default=1.0, help='replay speed multiplier')
+    parser.add_argument('--profile', action='store_true', help='start with the performance overlay on (F3 toggles)')
+    parser.add_argument('--trace', metavar='FILE', help='write a Chrome trace-event JSON of every frame on exit')
+    parser.add_argument('--board', type=parse_board_size, metavar='WxH',
+                        help='play on a fixed large board (e.g. 500x500) with a scrolling camera')
+    parser.add_argument('--name', default='Player', help='name recorded on the leaderboard')
+    parser.add_argument('--leaderboard', action='store_true', help='print the leaderboard and exit')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='print how long each startup phase took')
+    parser.add_argument('--autopilot', action='store_true',
+                        help='start straight into a game steered by the autopilot')
+    args = parser.parse_args()
+    
+    if args.leaderboard:
+        scores = HighScores()
+        for i, entry in enumerate(scores.leaderboard, 1):
+            print(f"{i:2}. {entry['name']:<16} {entry['score']:5}  level {entry['level']:2}  "
+                  f"seed {entry['seed']}  {entry['date'][:16]}")
+        scores.close()
+        sys.exit()
+    
+    game = SnakeGame(seed=args.seed, dirty_rects=args.dirty_rects, report_cache_stats=args.cache_stats,
+                     smooth=args.smooth, record_dir=args.record, player_name=args.name,
+                     profile=args.profile, trace_path=args.trace, board_size=args.board,
+                     report_startup=args.startup_report)
+    if args.replay:
+        game.start_replay(Replay.load(args.replay), args.replay_speed)
+    elif args.autopilot:
+        game.set_autopilot(True)
+        game.reset_game()
+        game.state = GameState.PLAYING
+    game.run(fps=args.fps, render=not args.no_render, turbo=args.turbo)
\ No newline at end of file
@@ -0,0 +1,224 @@
+import argparse
+import math
+import os
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from simulation import Direction, ObstacleSnake, OPPOSITE, Simulation
+from snapshot import restore, snapshot
+
+
+# Monte Carlo lookahead controller: for each direction the player could take
+# next, play many short rollouts from the current state with a noisy greedy
+# policy and pick the direction whose rollouts did best. Rollouts survive,
+# eat food or die under the real Simulation rules, obstacle AI included.
+#
+# Work is spread over a process pool (or threads, or inline). Each move the
+# pool gets the state as a compact snapshot, and every worker keeps one
+# RolloutBuffer whose lists are overwritten in place for each rollout rather
+# than copied. Rollouts either run until a time budget, a fraction of the
+# current move delay, or a fixed count per direction for reproducible runs.
+
+ROLLOUT_DEPTH = 24
+BUDGET_FRACTION = 0.5
+EPSILON = 0.2  # chance a rollout step is random instead of greedy
+FOOD_REWARD = 1.0
+DEATH_PENALTY = 2.0
+
+DIRECTIONS = list(Direction)
+SCALARS = ('seed', 'board_size', 'obstacle_ai', 'grid_width', 'grid_height', 'level', 'max_level',
+           'move_delay', 'base_delay', 'score', 'tick', 'elapsed', 'special_food_timer', 'slow_until',
+           'ghost_until', 'game_over', 'won', 'death_cause', 'direction', 'next_direction', 'last_tail',
+           'food')
+
+
+class RolloutBuffer:
+    # One scratch Simulation that is reset to a root state before each
+    # rollout by copying into its existing lists. Food and Item objects are
+    # shared with the root: the simulation replaces them, never mutates them.
+    def __init__(self):
+        self.sim = Simulation(0)
+
+    def reset(self, root):
+        sim = self.sim
+        for name in SCALARS:
+            setattr(sim, name, getattr(root, name))
+        sim.rng.setstate(root.rng.getstate())
+        sim.snake[:] = root.snake
+        sim.walls[:] = root.walls
+        sim.events.clear()
+        sim.items.clear()
+        sim.items.update(root.items)
+        sim.timers.heap[:] = root.timers.heap
+        sim.timers.seq = root.timers.seq
+        sim.board.copy_from(root.board)
+        obstacles = sim.obstacle_snakes
+        del obstacles[len(root.obstacle_snakes):]
+        while len(obstacles) < len(root.obstacle_snakes):
+            obstacles.append(ObstacleSnake([], Direction.RIGHT))
+        for obs, original in zip(obstacles, root.obstacle_snakes):
+            obs.body[:] = original.body
+            obs.direction = original.direction
+            obs.strategy = original.strategy
+            obs.move_delay = original.move_delay
+            obs.last_move = original.last_move
+        return sim
+
+
+def policy(sim, rng):
+    # Greedy towards the food over free cells, random EPSILON of the time
+    hx, hy = sim.snake[0]
+    board = sim.board
+    moves = []
+    for direction in DIRECTIONS:
+        dx, dy = direction.value
+        if direction != OPPOSITE[sim.direction] and not board.is_blocked((hx + dx, hy + dy)):
+            moves.append(direction)
+    if not moves:
+        return sim.direction
+    if sim.food is None or rng.random() < EPSILON:
+        return rng.choice(moves)
+    fx, fy = sim.food.pos
+    return min(moves, key=lambda d: abs(hx + d.value[0] - fx) + abs(hy + d.value[1] - fy))
+
+
+def rollout(buffer, root, first, depth, rng):
+    sim = buffer.reset(root)
+    score = sim.score
+    sim.set_direction(first)
+    steps = 0
+    while steps < depth and not sim.game_over:
+        if steps:
+            sim.set_direction(policy(sim, rng))
+        sim.step()
+        sim.events.clear()
+        steps += 1
+    value = (sim.score - score) * FOOD_REWARD
+    if sim.game_over and not sim.won:
+        # Dying late is less bad than dying now
+        return value - DEATH_PENALTY * (1 - steps / (depth + 1))
+    if sim.food is not None:
+        # Tie-break: end up close to the food
+        hx, hy = sim.snake[0]
+        fx, fy = sim.food.pos
+        value -= 0.1 * (abs(hx - fx) + abs(hy - fy)) / (sim.grid_width + sim.grid_height)
+    return value
+
+
+_local = threading.local()
+
+
+def run_rollouts(state, codes, depth, budget, count, seed):
+    # Worker entry point. state is a Simulation, or a snapshot of one when it
+    # had to cross a process boundary. Cycles through the first moves in codes
+    # until the budget (seconds) runs out or each has had count rollouts, and
+    # returns the summed values and rollout counts per move.
+    root = restore(state) if isinstance(state, bytes) else state
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = RolloutBuffer()
+    rng = random.Random(seed)
+    first = [DIRECTIONS[code] for code in codes]
+    totals = [0.0] * len(first)
+    counts = [0] * len(first)
+    deadline = time.perf_counter() + budget if budget is not None else None
+    i = 0
+    while count is None or i < count * len(first):
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+        k = i % len(first)
+        totals[k] += rollout(buffer, root, first[k], depth, rng)
+        counts[k] += 1
+        i += 1
+    return totals, counts
+
+
+class MonteCarlo:
+    # Controller: call with the simulation to get the direction to steer.
+    # workers=None uses every core; 0 or 1 runs rollouts inline. rollouts
+    # (per direction, per move) replaces the time budget when set.
+    def __init__(self, workers=None, pool='process', rollouts=None, depth=ROLLOUT_DEPTH,
+                 budget_fraction=BUDGET_FRACTION, seed=None):
+        self.workers = os.cpu_count() if workers is None else workers
+        self.pool = pool
+        self.rollouts = rollouts
+        self.depth = depth
+        self.budget_fraction = budget_fraction
+        self.rng = random.Random(seed)
+        self.executor = None
+        self.last_rollouts = 0
+
+    def __call__(self, sim):
+        hx, hy = sim.snake[0]
+        moves = [d for d in DIRECTIONS if d != OPPOSITE[sim.direction]]
+        safe = [d for d in moves if not sim.board.is_blocked((hx + d.value[0], hy + d.value[1]))]
+        moves = safe or moves
+        if len(moves) == 1:
+            self.last_rollouts = 0
+            return moves[0]
+
+        codes = [DIRECTIONS.index(d) for d in moves]
+        budget = None if self.rollouts else sim.move_delay / 1000 * self.budget_fraction
+        if self.workers <= 1:
+            results = [run_rollouts(sim, codes, self.depth, budget, self.rollouts, self.rng.getrandbits(32))]
+        else:
+            if self.executor is None:
+                executor = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+                self.executor = executor(self.workers)
+            state = snapshot(sim) if self.pool == 'process' else sim
+            count = math.ceil(self.rollouts / self.workers) if self.rollouts else None
+            futures = [self.executor.submit(run_rollouts, state, codes, self.depth, budget, count,
+                                            self.rng.getrandbits(32))
+                       for _ in range(self.workers)]
+            results = [future.result() for future in futures]
+
+        totals = [sum(result[0][k] for result in results) for k in range(len(moves))]
+        counts = [sum(result[1][k] for result in results) for k in range(len(moves))]
+        self.last_rollouts = sum(counts)
+        if not self.last_rollouts:
+            # Budget gone before a single rollout finished
+            return policy(sim, self.rng)
+        best = max((k for k in range(len(moves)) if counts[k]), key=lambda k: totals[k] / counts[k])
+        return moves[best]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play one headless game with the Monte Carlo controller')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None, help='pool size (default: CPU count, 0 = inline)')
+    parser.add_argument('--pool', choices=('process', 'thread'), default='process')
+    parser.add_argument('--rollouts', type=int, default=None,
+                        help='rollouts per direction each move, instead of the time budget')
+    parser.add_argument('--depth', type=int, default=ROLLOUT_DEPTH, help='ticks per rollout')
+    parser.add_argument('--budget', type=float, default=BUDGET_FRACTION,
+                        help='fraction of the move delay spent thinking each move')
+    parser.add_argument('--max-ticks', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    controller = MonteCarlo(args.workers, args.pool, args.rollouts, args.depth, args.budget, args.seed)
+    sim = Simulation(args.seed)
+    rollouts = 0
+    start = time.perf_counter()
+    try:
+        while not sim.game_over and sim.tick < args.max_ticks:
+            sim.set_direction(controller(sim))
+            rollouts += controller.last_rollouts
+            sim.step()
+            sim.events.clear()
+    finally:
+        controller.close()
+    elapsed = time.perf_counter() - start
+    cause = sim.death_cause if sim.game_over else 'timeout'
+    print(f"score {sim.score}, level {sim.level}, {sim.tick} ticks, ended by {cause}")
+    print(f"{rollouts / max(1, sim.tick):.0f} rollouts per move, {elapsed / max(1, sim.tick) * 1000:.1f} ms per move")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,495 @@
+import argparse
+import asyncio
+import random
+import sys
+import time
+from collections import deque
+
+from arena import (ARENA_WIDTH, ARENA_HEIGHT, DIE, DIRECTIONS, FOOD, JOIN, LEAVE, MOVE, SPAWN, TAIL, WALL,
+                   ArenaSimulation, arena_checksum)
+from replay import read_varint, write_varint
+from simulation import OPPOSITE
+
+
+# LAN multiplayer over asyncio. The server owns the only ArenaSimulation and
+# steps it at a fixed rate. Inputs that arrive during a tick are batched, and
+# only the latest direction per player is applied. Each tick it broadcasts
+# one encoded message of that tick's deltas. A connection gets a full
+# snapshot once, when it joins.
+#
+# Messages are varint length-prefixed frames. The first byte is the type:
+#   client -> server  C_JOIN name | C_INPUT direction
+#   server -> client  S_WELCOME player id, snapshot | S_TICK tick, deltas
+# Cells are sent as flat varint indices. A head move is one tag byte that
+# carries the direction, followed by the player id. Every CHECK_INTERVAL
+# ticks a state checksum is included so clients can verify their mirror.
+
+C_JOIN, C_INPUT = 1, 2
+S_WELCOME, S_TICK = 1, 2
+
+# Delta record tags; moves use one tag per direction
+T_JOIN, T_LEAVE, T_SPAWN, T_TAIL, T_DIE, T_FOOD, T_WALL, T_CHECK = range(1, 9)
+T_MOVE = 16
+DIRECTION_CODES = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+TICK_RATE = 10
+CHECK_INTERVAL = 50
+MAX_CLIENT_BUFFER = 1 << 20  # bytes queued for a client before it is dropped
+PORT = 7777
+
+
+def frame(payload):
+    out = bytearray()
+    write_varint(out, len(payload))
+    out += payload
+    return bytes(out)
+
+
+async def read_frame(reader):
+    length = 0
+    shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            break
+        shift += 7
+    return await reader.readexactly(length)
+
+
+def write_text(out, text):
+    data = text.encode()
+    write_varint(out, len(data))
+    out += data
+
+
+def read_text(data, pos):
+    length, pos = read_varint(data, pos)
+    return data[pos:pos + length].decode(), pos + length
+
+
+def encode_tick(tick, deltas, width, checksum=None):
+    out = bytearray([S_TICK])
+    write_varint(out, tick)
+    for delta in deltas:
+        kind = delta[0]
+        if kind == MOVE:
+            out.append(T_MOVE + DIRECTION_CODES[delta[2]])
+            write_varint(out, delta[1])
+        elif kind == TAIL:
+            out.append(T_TAIL)
+            write_varint(out, delta[1])
+        elif kind == FOOD or kind == WALL:
+            out.append(T_FOOD if kind == FOOD else T_WALL)
+            x, y = delta[1]
+            write_varint(out, y * width + x)
+        elif kind == SPAWN:
+            out.append(T_SPAWN)
+            write_varint(out, delta[1])
+            x, y = delta[2]
+            write_varint(out, y * width + x)
+            out.append(DIRECTION_CODES[delta[3]])
+        elif kind == DIE:
+            out.append(T_DIE)
+            write_varint(out, delta[1])
+        elif kind == JOIN:
+            out.append(T_JOIN)
+            write_varint(out, delta[1])
+            write_text(out, delta[2])
+        elif kind == LEAVE:
+            out.append(T_LEAVE)
+            write_varint(out, delta[1])
+    if checksum is not None:
+        out.append(T_CHECK)
+        write_varint(out, checksum)
+    return bytes(out)
+
+
+def encode_welcome(player_id, arena):
+    w = arena.width
+    out = bytearray([S_WELCOME])
+    for value in (player_id, arena.tick, arena.width, arena.height, len(arena.snakes)):
+        write_varint(out, value)
+    for snake in arena.snakes.values():
+        write_varint(out, snake.id)
+        write_text(out, snake.name)
+        write_varint(out, snake.score)
+        out.append(DIRECTION_CODES[snake.direction])
+        write_varint(out, len(snake.body))
+        for x, y in snake.body:
+            write_varint(out, y * w + x)
+    for cells in (arena.food, arena.walls):
+        write_varint(out, len(cells))
+        for x, y in cells:
+            write_varint(out, y * w + x)
+    return bytes(out)
+
+
+def arena_state_checksum(arena):
+    return arena_checksum({snake.id: snake.body for snake in arena.snakes.values()}, arena.food, arena.walls)
+
+
+class ArenaMirror:
+    # Client-side copy of the arena, kept current by applying tick deltas
+    def __init__(self, data):
+        pos = 1
+        self.player_id, pos = read_varint(data, pos)
+        self.tick, pos = read_varint(data, pos)
+        self.width, pos = read_varint(data, pos)
+        self.height, pos = read_varint(data, pos)
+        count, pos = read_varint(data, pos)
+        self.names = {}
+        self.scores = {}
+        self.directions = {}
+        self.bodies = {}
+        self.occupied = {}
+        for _ in range(count):
+            player_id, pos = read_varint(data, pos)
+            self.names[player_id], pos = read_text(data, pos)
+            self.scores[player_id], pos = read_varint(data, pos)
+            self.directions[player_id] = DIRECTIONS[data[pos]]
+            length, pos = read_varint(data, pos + 1)
+            body = self.bodies[player_id] = deque()
+            for _ in range(length):
+                cell, pos = read_varint(data, pos)
+                body.append(self.cell(cell))
+                self.occupy(body[-1], 1)
+        cells = []
+        for _ in range(2):
+            count, pos = read_varint(data, pos)
+            group = []
+            for _ in range(count):
+                cell, pos = read_varint(data, pos)
+                group.append(self.cell(cell))
+            cells.append(group)
+        self.food = set(cells[0])
+        self.walls = set(cells[1])
+        self.checks = 0
+        self.desyncs = 0
+
+    def cell(self, index):
+        return (index % self.width, index // self.width)
+
+    def occupy(self, pos, n):
+        count = self.occupied.get(pos, 0) + n
+        if count:
+            self.occupied[pos] = count
+        else:
+            del self.occupied[pos]
+
+    def apply(self, data):
+        self.tick, pos = read_varint(data, 1)
+        end = len(data)
+        while pos < end:
+            tag = data[pos]
+            pos += 1
+            if tag >= T_MOVE:
+                player_id, pos = read_varint(data, pos)
+                direction = DIRECTIONS[tag - T_MOVE]
+                body = self.bodies[player_id]
+                x, y = body[0]
+                head = (x + direction.value[0], y + direction.value[1])
+                body.appendleft(head)
+                self.occupy(head, 1)
+                self.directions[player_id] = direction
+                if head in self.food:
+                    self.food.remove(head)
+                    self.scores[player_id] += 1
+            elif tag == T_TAIL:
+                player_id, pos = read_varint(data, pos)
+                self.occupy(self.bodies[player_id].pop(), -1)
+            elif tag == T_FOOD:
+                cell, pos = read_varint(data, pos)
+                self.food.add(self.cell(cell))
+            elif tag == T_WALL:
+                cell, pos = read_varint(data, pos)
+                self.walls.add(self.cell(cell))
+            elif tag == T_SPAWN:
+                player_id, pos = read_varint(data, pos)
+                cell, pos = read_varint(data, pos)
+                self.bodies[player_id] = deque([self.cell(cell)])
+                self.occupy(self.cell(cell), 1)
+                self.directions[player_id] = DIRECTIONS[data[pos]]
+                self.scores[player_id] = 0
+                pos += 1
+            elif tag == T_DIE:
+                player_id, pos = read_varint(data, pos)
+                for cell in self.bodies[player_id]:
+                    self.occupy(cell, -1)
+                self.bodies[player_id].clear()
+            elif tag == T_JOIN:
+                player_id, pos = read_varint(data, pos)
+                self.names[player_id], pos = read_text(data, pos)
+                self.bodies[player_id] = deque()
+                self.scores[player_id] = 0
+                self.directions[player_id] = DIRECTIONS[0]
+            elif tag == T_LEAVE:
+                player_id, pos = read_varint(data, pos)
+                for cell in self.bodies.pop(player_id):
+                    self.occupy(cell, -1)
+                del self.names[player_id], self.scores[player_id], self.directions[player_id]
+            elif tag == T_CHECK:
+                checksum, pos = read_varint(data, pos)
+                self.checks += 1
+                if checksum != arena_checksum(self.bodies, self.food, self.walls):
+                    self.desyncs += 1
+            else:
+                raise ValueError(f"unknown delta tag {tag}")
+
+    def blocked(self, pos):
+        return (not (0 <= pos[0] < self.width and 0 <= pos[1] < self.height) or
+                pos in self.occupied or pos in self.walls)
+
+
+class ArenaServer:
+    def __init__(self, arena, tick_rate=TICK_RATE):
+        self.arena = arena
+        self.interval = 1 / tick_rate
+        self.clients = {}  # player id -> StreamWriter
+        self.inputs = {}  # player id -> latest direction this tick
+        self.joins = []  # (name, writer, joined future) waiting for the next tick
+        self.leaves = set()
+        self.server = None
+        self.tick_times = deque(maxlen=100)
+        self.bytes_sent = 0
+
+    async def start(self, host='0.0.0.0', port=PORT):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        player_id = None
+        try:
+            data = await read_frame(reader)
+            if not data or data[0] != C_JOIN:
+                return
+            name = read_text(data, 1)[0][:32]
+            joined = asyncio.get_running_loop().create_future()
+            self.joins.append((name, writer, joined))
+            player_id = await joined
+            while True:
+                data = await read_frame(reader)
+                if len(data) == 2 and data[0] == C_INPUT and data[1] < len(DIRECTIONS):
+                    self.inputs[player_id] = DIRECTIONS[data[1]]
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Shutdown: the handler task is the top level, nothing awaits it
+            pass
+        finally:
+            if player_id is not None:
+                self.leaves.add(player_id)
+            writer.close()
+
+    def tick(self):
+        arena = self.arena
+        for player_id in self.leaves:
+            self.clients.pop(player_id, None)
+            self.inputs.pop(player_id, None)
+            arena.leave(player_id)
+        self.leaves.clear()
+        joins, self.joins = self.joins, []
+        new = []
+        for name, writer, joined in joins:
+            if joined.cancelled():
+                continue
+            player_id = arena.join(name)
+            new.append((player_id, writer))
+            joined.set_result(player_id)
+
+        for player_id, direction in self.inputs.items():
+            arena.set_direction(player_id, direction)
+        self.inputs.clear()
+        arena.step()
+
+        checksum = arena_state_checksum(arena) if arena.tick % CHECK_INTERVAL == 0 else None
+        message = frame(encode_tick(arena.tick, arena.drain_deltas(), arena.width, checksum))
+        for player_id, writer in list(self.clients.items()):
+            self.send(player_id, writer, message)
+        # Newcomers start from a snapshot that already includes this tick
+        for player_id, writer in new:
+            self.clients[player_id] = writer
+            self.send(player_id, writer, frame(encode_welcome(player_id, arena)))
+
+    def send(self, player_id, writer, message):
+        if writer.is_closing() or writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            # Too slow to keep up: cut it loose rather than buffer forever
+            writer.close()
+            self.clients.pop(player_id, None)
+            self.leaves.add(player_id)
+            return
+        writer.write(message)
+        self.bytes_sent += len(message)
+
+    async def run(self, ticks=None, report=None):
+        # Fixed rate: deadlines advance by the interval regardless of how long
+        # a tick took, and a late tick runs straight away
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        last_report = loop.time()
+        count = 0
+        while ticks is None or count < ticks:
+            deadline += self.interval
+            start = time.perf_counter()
+            self.tick()
+            self.tick_times.append(time.perf_counter() - start)
+            count += 1
+            if report and loop.time() - last_report >= report:
+                last_report = loop.time()
+                self.print_stats()
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                deadline = loop.time()
+                await asyncio.sleep(0)
+
+    def print_stats(self):
+        times = sorted(self.tick_times)
+        alive = sum(1 for snake in self.arena.snakes.values() if snake.alive)
+        print(f"tick {self.arena.tick}: {len(self.clients)} clients, {alive} alive, "
+              f"tick p50 {times[len(times) // 2] * 1000:.2f} ms max {times[-1] * 1000:.2f} ms, "
+              f"{self.bytes_sent} bytes sent", flush=True)
+
+    async def close(self):
+        self.server.close()
+        for writer in self.clients.values():
+            writer.close()
+        await self.server.wait_closed()
+
+
+class Bot:
+    # Headless load-test client: mirrors the arena from deltas and steers
+    # towards the nearest food it can see without stepping into anything
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.rng = random.Random(seed)
+        self.mirror = None
+        self.ticks = 0
+        self.bytes = 0
+        self.latencies = []
+
+    async def play(self, host, port, seconds):
+        reader, writer = await asyncio.open_connection(host, port)
+        out = bytearray([C_JOIN])
+        write_text(out, self.name)
+        writer.write(frame(out))
+        loop = asyncio.get_running_loop()
+        end = loop.time() + seconds
+        try:
+            while loop.time() < end:
+                data = await asyncio.wait_for(read_frame(reader), timeout=max(0.01, end - loop.time()))
+                self.bytes += len(data)
+                if data[0] == S_WELCOME:
+                    self.mirror = ArenaMirror(data)
+                elif data[0] == S_TICK and self.mirror:
+                    start = time.perf_counter()
+                    self.mirror.apply(data)
+                    self.ticks += 1
+                    direction = self.choose()
+                    if direction is not None:
+                        writer.write(frame(bytes([C_INPUT, DIRECTIONS.index(direction)])))
+                    self.latencies.append(time.perf_counter() - start)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def choose(self):
+        mirror = self.mirror
+        body = mirror.bodies.get(mirror.player_id)
+        if not body:
+            return None
+        current = mirror.directions[mirror.player_id]
+        x, y = body[0]
+        food = min(mirror.food, key=lambda f: abs(f[0] - x) + abs(f[1] - y), default=None)
+        best = None
+        best_dist = None
+        for direction in DIRECTIONS:
+            if direction == OPPOSITE[current]:
+                continue
+            pos = (x + direction.value[0], y + direction.value[1])
+            if mirror.blocked(pos):
+                continue
+            dist = abs(pos[0] - food[0]) + abs(pos[1] - food[1]) if food else self.rng.random()
+            if best is None or dist < best_dist:
+                best, best_dist = direction, dist
+        return best if best != current else None
+
+
+async def load_test(host, port, bots, seconds, seed=0):
+    players = [Bot(f"bot{i}", seed + i) for i in range(bots)]
+    started = time.perf_counter()
+    await asyncio.gather(*(bot.play(host, port, seconds) for bot in players))
+    elapsed = time.perf_counter() - started
+    ticks = sum(bot.ticks for bot in players)
+    latencies = sorted(t for bot in players for t in bot.latencies)
+    return {
+        'bots': bots,
+        'seconds': elapsed,
+        'ticks_per_bot': ticks / bots,
+        'bytes_per_bot_per_tick': sum(bot.bytes for bot in players) / max(1, ticks),
+        'client_tick_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'checks': sum(bot.mirror.checks for bot in players if bot.mirror),
+        'desyncs': sum(bot.mirror.desyncs for bot in players if bot.mirror),
+    }
+
+
+async def serve(args):
+    server = ArenaServer(ArenaSimulation(args.width, args.height, args.seed), args.tick_rate)
+    port = await server.start(args.host, args.port)
+    print(f"Serving {args.width}x{args.height} arena on {args.host}:{port} at {args.tick_rate} ticks/s", flush=True)
+    try:
+        await server.run(report=args.report)
+    finally:
+        await server.close()
+
+
+async def selftest(args):
+    # Server and bots in one process over localhost
+    server = ArenaServer(ArenaSimulation(args.width, args.height, args.seed), args.tick_rate)
+    port = await server.start('127.0.0.1', 0)
+    ticking = asyncio.ensure_future(server.run(report=args.report))
+    result = await load_test('127.0.0.1', port, args.bots, args.seconds, args.seed or 0)
+    ticking.cancel()
+    await server.close()
+    times = sorted(server.tick_times)
+    result['server_tick_p50_ms'] = times[len(times) // 2] * 1000
+    result['server_tick_max_ms'] = times[-1] * 1000
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='LAN multiplayer snake server and load-test client')
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('server', 'client', 'selftest'):
+        p = sub.add_parser(name)
+        p.add_argument('--host', default='127.0.0.1' if name != 'server' else '0.0.0.0')
+        p.add_argument('--port', type=int, default=PORT)
+        p.add_argument('--seed', type=int, default=None)
+        if name != 'client':
+            p.add_argument('--width', type=int, default=ARENA_WIDTH)
+            p.add_argument('--height', type=int, default=ARENA_HEIGHT)
+            p.add_argument('--tick-rate', type=float, default=TICK_RATE)
+            p.add_argument('--report', type=float, default=None, metavar='SECONDS',
+                           help='print server stats this often')
+        if name != 'server':
+            p.add_argument('--bots', type=int, default=100)
+            p.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == 'server':
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'client':
+        print(asyncio.run(load_test(args.host, args.port, args.bots, args.seconds, args.seed or 0)))
+    else:
+        result = asyncio.run(selftest(args))
+        print(result)
+        return 1 if result['desyncs'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+import json
+import os
+import time
+from collections import deque
+
+
+# Frame profiler for the game loop. Named sections are timed with
+#
+#     with profiler.section('update_game'):
+#         ...
+#
+# and fed into per-section moving averages, a window of recent frame times
+# for percentiles, and (when tracing) a list of Chrome trace events that
+# export() writes for chrome://tracing or Perfetto. Sections may nest. While
+# the profiler is disabled, section() hands back a shared no-op, so the
+# instrumentation can stay in place at next to no cost.
+
+SMOOTHING = 0.05
+MAX_TRACE_EVENTS = 1000000
+
+
+class NullSection:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = NullSection()
+
+
+class Section:
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.open(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class FrameProfiler:
+    def __init__(self, window=600, trace=False, max_events=MAX_TRACE_EVENTS):
+        self.enabled = trace
+        self.trace = trace
+        self.max_events = max_events
+        self.events = []
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        self.frame_times = deque(maxlen=window)
+        self.frame_start = None
+        self.frame_count = 0
+        self.current = {}
+        # Moving average of seconds per frame in each section, and each
+        # section's nesting depth in the order sections were first entered
+        self.averages = {}
+        self.depths = {}
+        self.depth = 0
+        self.counters = {}
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        return Section(self, name)
+
+    def open(self, name):
+        if name not in self.depths:
+            self.depths[name] = self.depth
+        self.depth += 1
+
+    def record(self, name, start, end):
+        self.depth -= 1
+        self.current[name] = self.current.get(name, 0.0) + (end - start)
+        if self.trace:
+            self.add_event({'name': name, 'ph': 'X', 'ts': self.micros(start),
+                            'dur': (end - start) * 1e6, 'pid': os.getpid(), 'tid': 0})
+
+    def begin_frame(self):
+        if not self.enabled:
+            self.frame_start = None
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            self.frame_times.append(now - self.frame_start)
+        self.frame_start = now
+        self.current = {}
+
+    def end_frame(self, **counters):
+        # counters are per-frame values such as particle count or draw calls
+        if self.frame_start is None:
+            return
+        self.frame_count += 1
+        for name, seconds in self.current.items():
+            average = self.averages.get(name)
+            self.averages[name] = seconds if average is None else average + (seconds - average) * SMOOTHING
+        # Sections skipped this frame decay towards zero
+        for name in self.averages.keys() - self.current.keys():
+            self.averages[name] -= self.averages[name] * SMOOTHING
+        self.counters = counters
+        if self.trace and counters:
+            self.add_event({'name': 'frame', 'ph': 'C', 'ts': self.micros(time.perf_counter()),
+                            'pid': os.getpid(), 'args': counters})
+
+    def percentiles(self, *ps):
+        # Frame time in milliseconds at each percentile of the recent window
+        times = sorted(self.frame_times)
+        if not times:
+            return [0.0 for _ in ps]
+        return [times[min(len(times) - 1, int(len(times) * p / 100))] * 1000 for p in ps]
+
+    def breakdown(self):
+        # (name, nesting depth, average ms per frame), parents before children
+        return [(name, depth, self.averages.get(name, 0.0) * 1000) for name, depth in self.depths.items()]
+
+    def micros(self, t):
+        return (t - self.origin) * 1e6
+
+    def add_event(self, event):
+        if len(self.events) < self.max_events:
+            self.events.append(event)
+        else:
+            self.dropped += 1
+
+    def export(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                'traceEvents': self.events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'dropped_events': self.dropped},
+            }, f)
+
+
+class StartupTimer:
+    # Wall time of each startup phase, measured from start to each mark()
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def has(self, name):
+        return any(phase == name for phase, _ in self.phases)
+
+    def report(self):
+        lines = [f"{name:<12} {seconds * 1000:7.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total':<12} {(self.last - self.start) * 1000:7.1f} ms")
+        return '\n'.join(lines)
@@ -0,0 +1,313 @@
+import os
+import queue
+import threading
+import time
+import zlib
+
+from simulation import Direction, Simulation
+from snapshot import restore, snapshot
+
+
+# Replays store only what the deterministic simulation cannot derive: the RNG
+# seed and the direction applied on every tick. Level transitions and periodic
+# state checksums are stored too so playback can be verified as it runs: a
+# level change has to happen on its recorded tick, and every CHECK_INTERVAL
+# ticks the whole visible state (both snakes' bodies, walls, food and items)
+# has to hash the same. Checking every tick would cost more file than inputs.
+#
+# Stream layout: MAGIC, VERSION, zigzag varint seed, varint board width and
+# height (0, 0 for the default growing board), then records of a tag byte
+# followed by varints:
+#   TAG_INPUT    direction code, run length   (run-length encoded inputs)
+#   TAG_LEVEL    tick, level
+#   TAG_CHECK    tick, crc32 of the state after that tick
+#   TAG_END      final tick, score
+
+MAGIC = b'SNKR'
+# Bumped whenever the simulation rules change in a way old inputs can't replay
+VERSION = 7
+
+TAG_INPUT = 1
+TAG_LEVEL = 2
+TAG_CHECK = 3
+TAG_END = 4
+
+DIRECTIONS = list(Direction)
+DIRECTION_CODES = {direction: i for i, direction in enumerate(DIRECTIONS)}
+
+CHECK_INTERVAL = 32
+SNAPSHOT_INTERVAL = 256
+FLUSH_INTERVAL = 256
+
+
+class ReplayDesyncError(Exception):
+    def __init__(self, tick, expected, actual, field='checksum'):
+        if field == 'checksum':
+            shown, recorded = f"{actual:#010x}", f"{expected:#010x}"
+        else:
+            shown, recorded = actual, expected
+        super().__init__(f"replay desynced at tick {tick}: {field} {shown}, recorded {recorded}")
+        self.field = field
+        self.tick = tick
+        self.expected = expected
+        self.actual = actual
+
+
+def write_varint(out, value):
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def zigzag(value):
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+
+def unzigzag(value):
+    return value // 2 if value % 2 == 0 else -(value + 1) // 2
+
+
+def state_checksum(sim):
+    obstacles = [obs.body for obs in sim.obstacle_snakes]
+    food = sim.food.pos if sim.food else None
+    items = sorted((pos, item.kind, item.expires) for pos, item in sim.items.items())
+    state = (sim.tick, sim.score, sim.level, sim.snake, food, obstacles, sim.walls, items, sim.game_over)
+    return zlib.crc32(repr(state).encode())
+
+
+class ReplayWriter:
+    # Background thread that appends encoded chunks to replay files, so the
+    # game loop only ever enqueues bytes
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='replay-writer', daemon=True)
+        self.thread.start()
+
+    def write(self, path, data, close=False):
+        self.queue.put((path, bytes(data), close))
+
+    def run(self):
+        files = {}
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            path, data, close = item
+            f = files.get(path)
+            if f is None:
+                f = files[path] = open(path, 'ab')
+            f.write(data)
+            if close:
+                f.close()
+                del files[path]
+        for f in files.values():
+            f.close()
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class ReplayRecorder:
+    def __init__(self, path, seed, writer=None, board_size=None):
+        self.path = path
+        self.writer = writer
+        self.buffer = bytearray(MAGIC)
+        self.buffer.append(VERSION)
+        write_varint(self.buffer, zigzag(seed))
+        width, height = board_size or (0, 0)
+        write_varint(self.buffer, width)
+        write_varint(self.buffer, height)
+        self.run_code = None
+        self.run_length = 0
+        self.level = 1
+        self.flushed = False
+        self.closed = False
+
+    def record(self, sim):
+        # Call after every tick; sim.direction is the input that tick applied
+        code = DIRECTION_CODES[sim.direction]
+        if code == self.run_code:
+            self.run_length += 1
+        else:
+            self.flush_run()
+            self.run_code = code
+            self.run_length = 1
+        # Level and check records carry their tick, so they can sit in the
+        # middle of an input run
+        if sim.level != self.level:
+            self.level = sim.level
+            self.buffer.append(TAG_LEVEL)
+            write_varint(self.buffer, sim.tick)
+            write_varint(self.buffer, sim.level)
+        if sim.tick % CHECK_INTERVAL == 0 or sim.game_over:
+            self.buffer.append(TAG_CHECK)
+            write_varint(self.buffer, sim.tick)
+            write_varint(self.buffer, state_checksum(sim))
+        if len(self.buffer) >= FLUSH_INTERVAL:
+            self.flush()
+        if sim.game_over:
+            self.finish(sim)
+
+    def flush_run(self):
+        if self.run_length:
+            self.buffer.append(TAG_INPUT)
+            self.buffer.append(self.run_code)
+            write_varint(self.buffer, self.run_length)
+            self.run_code = None
+            self.run_length = 0
+
+    def flush(self, close=False):
+        if self.writer is not None:
+            self.writer.write(self.path, self.buffer, close)
+        else:
+            with open(self.path, 'ab') as f:
+                f.write(self.buffer)
+        self.buffer = bytearray()
+        self.flushed = True
+
+    def finish(self, sim):
+        if self.closed:
+            return
+        self.closed = True
+        if sim.tick == 0 and not self.flushed:
+            # Abandoned before the first move: leave no file behind
+            return
+        self.flush_run()
+        self.buffer.append(TAG_END)
+        write_varint(self.buffer, sim.tick)
+        write_varint(self.buffer, sim.score)
+        self.flush(close=True)
+
+
+class Replay:
+    def __init__(self, seed, board_size=None):
+        self.seed = seed
+        self.board_size = board_size
+        self.inputs = bytearray()  # direction code per tick
+        self.levels = []  # (tick, level)
+        self.checks = {}  # tick -> checksum
+        self.final_tick = None
+        self.final_score = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.decode(f.read())
+
+    @classmethod
+    def decode(cls, data):
+        if len(data) < 5 or data[:4] != MAGIC:
+            raise ValueError("not a snake replay")
+        if data[4] != VERSION:
+            raise ValueError(f"unsupported replay version {data[4]}")
+        try:
+            return cls.decode_records(data)
+        except IndexError:
+            # Cut off inside a varint or record
+            raise ValueError("corrupt replay: truncated") from None
+
+    @classmethod
+    def decode_records(cls, data):
+        seed, pos = read_varint(data, 5)
+        width, pos = read_varint(data, pos)
+        height, pos = read_varint(data, pos)
+        replay = cls(unzigzag(seed), (width, height) if width else None)
+        while pos < len(data):
+            tag = data[pos]
+            pos += 1
+            if tag == TAG_INPUT:
+                code = data[pos]
+                length, pos = read_varint(data, pos + 1)
+                replay.inputs.extend(bytes([code]) * length)
+            elif tag == TAG_LEVEL:
+                tick, pos = read_varint(data, pos)
+                level, pos = read_varint(data, pos)
+                replay.levels.append((tick, level))
+            elif tag == TAG_CHECK:
+                tick, pos = read_varint(data, pos)
+                replay.checks[tick], pos = read_varint(data, pos)
+            elif tag == TAG_END:
+                replay.final_tick, pos = read_varint(data, pos)
+                replay.final_score, pos = read_varint(data, pos)
+            else:
+                raise ValueError(f"corrupt replay: unknown record {tag} at byte {pos - 1}")
+        return replay
+
+    def __len__(self):
+        return len(self.inputs)
+
+
+class ReplayPlayer:
+    # Re-runs a replay through the simulation, verifying checksums as it goes.
+    # Compact snapshots taken every SNAPSHOT_INTERVAL ticks make seeking cost
+    # at most that many ticks of re-simulation.
+    def __init__(self, replay, verify=True):
+        self.replay = replay
+        self.verify = verify
+        self.sim = Simulation(replay.seed, board_size=replay.board_size)
+        self.snapshots = {0: snapshot(self.sim)}
+        self.levels = dict(replay.levels)
+
+    def done(self):
+        return self.sim.game_over or self.sim.tick >= len(self.replay.inputs)
+
+    def step(self):
+        sim = self.sim
+        if self.done():
+            return False
+        sim.next_direction = DIRECTIONS[self.replay.inputs[sim.tick]]
+        level = sim.level
+        sim.step()
+        tick = sim.tick
+        if self.verify and sim.level != self.levels.get(tick, level):
+            raise ReplayDesyncError(tick, self.levels.get(tick, level), sim.level, 'level')
+        if self.verify and tick in self.replay.checks:
+            actual = state_checksum(sim)
+            if actual != self.replay.checks[tick]:
+                raise ReplayDesyncError(tick, self.replay.checks[tick], actual)
+        if tick % SNAPSHOT_INTERVAL == 0 and tick not in self.snapshots:
+            self.snapshots[tick] = snapshot(sim)
+        return True
+
+    def seek(self, tick):
+        tick = max(0, min(tick, len(self.replay.inputs)))
+        if tick < self.sim.tick or tick - self.sim.tick > SNAPSHOT_INTERVAL:
+            base = max(t for t in self.snapshots if t <= tick)
+            if tick < self.sim.tick or base > self.sim.tick:
+                self.sim = restore(self.snapshots[base])
+        while self.sim.tick < tick and self.step():
+            pass
+        return self.sim.tick
+
+    def play(self, speed=None, on_tick=None):
+        # speed is a multiplier on real time; None runs as fast as possible
+        next_time = time.perf_counter()
+        while self.step():
+            if on_tick:
+                on_tick(self.sim)
+            self.sim.events.clear()
+            if speed:
+                next_time += self.sim.move_delay / 1000 / speed
+                delay = next_time - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        return self.sim
+
+
+def replay_path(directory, seed):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{seed}.snkr")
@@ -0,0 +1,147 @@
+import json
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+
+# High scores and a top-N leaderboard. The snapshot file holds the compacted
+# leaderboard; finished games are appended to a log by a background thread,
+# so recording a score never blocks the game loop. At startup the log is
+# folded into the snapshot, which is rewritten atomically (temp file plus
+# rename) before the log is cleared. A crash can at worst cut the last log
+# line short, and that line is skipped.
+
+SCORES_PATH = 'snake_highscore.json'
+LOG_PATH = 'snake_scores.log'
+LEADERBOARD_SIZE = 10
+
+
+def atomic_write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def entry_key(entry):
+    # Best score first; ties go to whoever got there first
+    return (-entry['score'], entry['date'])
+
+
+class ScoreLog:
+    # Background appender: entries queued while it is busy are written
+    # together in one append
+    def __init__(self, path):
+        self.path = path
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='score-log', daemon=True)
+        self.thread.start()
+
+    def append(self, entry):
+        self.queue.put(entry)
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [entry for entry in batch if entry is not None]
+            if not batch:
+                continue
+            lines = ''.join(json.dumps(entry) + '\n' for entry in batch)
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"Could not save scores to {self.path}: {e}", file=sys.stderr)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+
+class HighScores:
+    def __init__(self, path=SCORES_PATH, log_path=LOG_PATH, size=LEADERBOARD_SIZE):
+        self.path = path
+        self.log_path = log_path
+        self.size = size
+        self.best = 0
+        self.leaderboard = []
+        self.load()
+        self.log = ScoreLog(log_path)
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.best = data.get('high_score', 0)
+            self.leaderboard = data.get('leaderboard', [])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable {self.path}: {e}", file=sys.stderr)
+
+        logged = []
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    try:
+                        logged.append(json.loads(line))
+                    except ValueError:
+                        # Torn write from a crash: drop the partial entry
+                        pass
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            print(f"Ignoring unreadable {self.log_path}: {e}", file=sys.stderr)
+            return
+        for entry in logged:
+            self.insert(entry)
+        self.compact()
+
+    def compact(self):
+        try:
+            atomic_write_json(self.path, {'high_score': self.best, 'leaderboard': self.leaderboard})
+            os.remove(self.log_path)
+        except OSError as e:
+            print(f"Could not compact scores into {self.path}: {e}", file=sys.stderr)
+
+    def insert(self, entry):
+        # Returns the entry's 1-based leaderboard rank, or None if it didn't place
+        self.best = max(self.best, entry['score'])
+        if entry in self.leaderboard:
+            return self.leaderboard.index(entry) + 1
+        self.leaderboard.append(entry)
+        self.leaderboard.sort(key=entry_key)
+        del self.leaderboard[self.size:]
+        if entry in self.leaderboard:
+            return self.leaderboard.index(entry) + 1
+        return None
+
+    def submit(self, name, score, level, seed):
+        entry = {
+            'name': name,
+            'score': score,
+            'level': level,
+            'seed': seed,
+            # Precise enough to tell games apart, so an entry found in both the
+            # snapshot and the log (crash mid-compaction) is only counted once
+            'date': datetime.now().isoformat(' ', timespec='milliseconds'),
+        }
+        rank = self.insert(entry)
+        if rank is not None:
+            self.log.append(entry)
+        return rank
+
+    def close(self):
+        self.log.close()
@@ -0,0 +1,891 @@
+import functools
+import heapq
+import math
+import random
+from collections import deque
+from enum import Enum
+
+
+# Headless game rules. Nothing in here may import pygame: the simulation is
+# advanced in discrete ticks (one player move per tick) with its own seeded
+# RNG, so it can run on render-less workers and replay deterministically.
+
+GRID_WIDTH = 25
+GRID_HEIGHT = 20
+MOVE_DELAY = 120
+MAX_LEVEL = 20
+MAX_GRID_WIDTH = 40
+MAX_GRID_HEIGHT = 30
+# Obstacle AI by spawn order; later levels bring the smarter ones into play
+OBSTACLE_AI = ('wander', 'guard', 'chase')
+GUARD_RADIUS = 3
+# Steps a SpatialField BFS goes out from its target, so obstacle AI cost
+# doesn't grow with the board
+FIELD_RADIUS = GUARD_RADIUS + 2
+MASK64 = (1 << 64) - 1
+# Special food: now and then the food is worth SPECIAL_SCORE points, and
+# turns back into normal food if not eaten within SPECIAL_FOOD_TICKS
+SPECIAL_FOOD_CHANCE = 0.15
+SPECIAL_FOOD_TICKS = 60
+SPECIAL_SCORE = 3
+# Power-up items: a batch spawns every ITEM_SPAWN_TICKS, up to one item per
+# ITEM_CELLS board cells, and each lasts ITEM_LIFETIME ticks unless picked up
+ITEM_KINDS = ('slow', 'shrink', 'ghost')
+ITEM_SPAWN_TICKS = 30
+ITEM_LIFETIME = 150
+ITEM_CELLS = 250
+SLOW_TICKS = 50
+SLOW_DELAY = 40  # ms added to the move delay while slowed
+SHRINK_CELLS = 3
+GHOST_TICKS = 30  # ticks the player can pass through itself and obstacle snakes
+# Wall layout of each level: the pattern of the highest entry at or below it
+LEVEL_PATTERNS = ((13, 'maze'), (7, 'rooms'), (2, 'scatter'))
+ROOM_SIZE = 12
+DOOR_WIDTH = 3
+MAZE_SPACING = 4  # corridors MAZE_SPACING - 1 cells wide
+MAZE_BRAID = 0.2  # chance a maze wall that would close a loop is opened anyway
+# Walls cover at most this much of the board, around the head, so building
+# a level costs the same on any board size
+LAYOUT_WIDTH = MAX_GRID_WIDTH
+LAYOUT_HEIGHT = MAX_GRID_HEIGHT
+LAYOUT_CACHE = 128
+
+
+class SimRandom(random.Random):
+    # SplitMix64 behind the random.Random API. Its whole state is one 64-bit
+    # word, so a snapshot of the simulation can carry it in 8 bytes instead
+    # of the 2.5 KB of Mersenne Twister state.
+    def seed(self, a=None, version=2):
+        if not isinstance(a, int):
+            a = random.Random(a).getrandbits(64)
+        self.state = a & MASK64
+        self.gauss_next = None
+
+    def next64(self):
+        self.state = z = (self.state + 0x9E3779B97F4A7C15) & MASK64
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def random(self):
+        return (self.next64() >> 11) * (1.0 / (1 << 53))
+
+    def getrandbits(self, k):
+        if k <= 64:
+            return self.next64() >> (64 - k)
+        value = 0
+        for shift in range(0, k, 64):
+            value |= self.next64() << shift
+        return value & ((1 << k) - 1)
+
+    def getstate(self):
+        return self.state, self.gauss_next
+
+    def setstate(self, state):
+        self.state, self.gauss_next = state
+
+class FoodType(Enum):
+    NORMAL = 1
+    SPECIAL = 2
+
+class Direction(Enum):
+    UP = (0, -1)
+    DOWN = (0, 1)
+    LEFT = (-1, 0)
+    RIGHT = (1, 0)
+
+OPPOSITE = {
+    Direction.UP: Direction.DOWN,
+    Direction.DOWN: Direction.UP,
+    Direction.LEFT: Direction.RIGHT,
+    Direction.RIGHT: Direction.LEFT,
+}
+
+class Occupancy:
+    # Per-cell counters for each kind of entity, so collision and free-cell
+    # checks are O(1) regardless of snake length. Counters (not flags) because
+    # obstacle snakes are allowed to overlap each other. Free cells are also
+    # counted per block of about sqrt(cells), so a random free cell is found
+    # in O(sqrt(cells)), and the pick depends only on which cells are free,
+    # never on the order they were freed: a board rebuilt from a snapshot
+    # hands out the same cells as the original.
+    SNAKE = 0
+    WALL = 1
+    OBSTACLE = 2
+
+    def __init__(self, width, height):
+        self.resize(width, height)
+
+    def resize(self, width, height):
+        self.width = width
+        self.height = height
+        cells = width * height
+        self.layers = [[0] * cells for _ in range(3)]
+        self.counts = [0] * cells
+        self.block = max(16, math.isqrt(cells))
+        self.block_free = [min(self.block, cells - start) for start in range(0, cells, self.block)]
+        self.free = cells
+
+    def copy_from(self, other):
+        # Becomes a copy of other, reusing this board's lists
+        self.width, self.height, self.block, self.free = other.width, other.height, other.block, other.free
+        for layer, values in zip(self.layers, other.layers):
+            layer[:] = values
+        self.counts[:] = other.counts
+        self.block_free[:] = other.block_free
+
+    def in_bounds(self, pos):
+        return 0 <= pos[0] < self.width and 0 <= pos[1] < self.height
+
+    def add(self, layer, pos):
+        i = pos[1] * self.width + pos[0]
+        self.layers[layer][i] += 1
+        self.counts[i] += 1
+        if self.counts[i] == 1:
+            self.block_free[i // self.block] -= 1
+            self.free -= 1
+
+    def add_many(self, layer, positions):
+        # add() for a batch of cells, with the free counts redone once after
+        if not positions:
+            return
+        cells = self.layers[layer]
+        counts = self.counts
+        w = self.width
+        for x, y in positions:
+            i = y * w + x
+            cells[i] += 1
+            counts[i] += 1
+        block = self.block
+        self.block_free = [counts[start:start + block].count(0) for start in range(0, len(counts), block)]
+        self.free = sum(self.block_free)
+
+    def remove(self, layer, pos):
+        i = pos[1] * self.width + pos[0]
+        self.layers[layer][i] -= 1
+        self.counts[i] -= 1
+        if self.counts[i] == 0:
+            self.block_free[i // self.block] += 1
+            self.free += 1
+
+    def has(self, layer, pos):
+        return self.layers[layer][pos[1] * self.width + pos[0]] > 0
+
+    def is_free(self, pos):
+        return self.counts[pos[1] * self.width + pos[0]] == 0
+
+    def is_blocked(self, pos):
+        return not self.in_bounds(pos) or not self.is_free(pos)
+
+    def free_count(self):
+        return self.free
+
+    def random_free_cell(self, rng, exclude=None):
+        # Uniform pick among free cells, optionally skipping one (e.g. the food):
+        # the k-th free cell in index order
+        n = self.free
+        skip = -1
+        if exclude is not None and self.is_free(exclude):
+            skip = exclude[1] * self.width + exclude[0]
+            n -= 1
+        if n <= 0:
+            return None
+        k = rng.randrange(n)
+        skip_block = skip // self.block if skip >= 0 else -1
+        block = 0
+        for block, free in enumerate(self.block_free):
+            if block == skip_block:
+                free -= 1
+            if k < free:
+                break
+            k -= free
+        counts = self.counts
+        start = block * self.block
+        for i in range(start, min(start + self.block, len(counts))):
+            if counts[i] == 0 and i != skip:
+                if k == 0:
+                    return (i % self.width, i // self.width)
+                k -= 1
+        return None
+
+class Food:
+    def __init__(self, pos, food_type=FoodType.NORMAL):
+        self.pos = pos
+        self.type = food_type
+
+class Item:
+    # A power-up lying on the board until it is picked up or expires
+    def __init__(self, pos, kind, expires):
+        self.pos = pos
+        self.kind = kind  # one of ITEM_KINDS
+        self.expires = expires  # tick
+
+class TimerQueue:
+    # Min-heap of (tick, seq, kind, data) timers keyed on simulation ticks.
+    # Scheduling and firing cost O(log n) each, and a tick with nothing due
+    # costs one comparison however many timers are pending. Timers are never
+    # cancelled: the handler checks the timer still applies when it fires.
+    def __init__(self):
+        self.heap = []
+        self.seq = 0  # keeps timers due on the same tick in scheduling order
+
+    def __len__(self):
+        return len(self.heap)
+
+    def clear(self):
+        self.heap.clear()
+        self.seq = 0
+
+    def schedule(self, tick, kind, data=None):
+        heapq.heappush(self.heap, (tick, self.seq, kind, data))
+        self.seq += 1
+
+    def pop_due(self, tick):
+        # Timers due at or before tick, earliest first; handlers may schedule more
+        heap = self.heap
+        while heap and heap[0][0] <= tick:
+            yield heapq.heappop(heap)
+
+class SpatialField:
+    # Shared view of the board for obstacle AI, built once per tick. BFS
+    # distance maps over free cells are computed on first request and reused
+    # by every obstacle snake that moves that tick. Each BFS stops
+    # FIELD_RADIUS steps out; anything further counts as unreachable.
+    def __init__(self, board, player_head, food):
+        self.board = board
+        self.player_head = player_head
+        self.food = food
+        self.maps = {}
+
+    def distance(self, target, pos):
+        # Steps from pos to target through free cells, or -1 if cut off or
+        # out of range
+        dist = self.maps.get(target)
+        if dist is None:
+            dist = self.maps[target] = self.bfs(target)
+        return dist.get(pos[1] * self.board.width + pos[0], -1)
+
+    def bfs(self, target):
+        w = self.board.width
+        size = w * self.board.height
+        counts = self.board.counts
+        start = target[1] * w + target[0]
+        dist = {start: 0}
+        queue = deque([start])
+        while queue:
+            i = queue.popleft()
+            d = dist[i] + 1
+            if d > FIELD_RADIUS:
+                break
+            x = i % w
+            for j in (i - w if i >= w else -1, i + w if i + w < size else -1,
+                      i - 1 if x > 0 else -1, i + 1 if x < w - 1 else -1):
+                if j >= 0 and j not in dist and counts[j] == 0:
+                    dist[j] = d
+                    queue.append(j)
+        return dist
+
+class ObstacleStrategy:
+    # Picks an obstacle snake's next (direction, head). Free moves are offered
+    # forward first, then right, left and back, so ties keep it going straight.
+    def choose(self, obs, board, field):
+        raise NotImplementedError
+
+    def candidates(self, obs, board, avoid=None):
+        x, y = obs.body[0]
+        for turn in (0, 1, -1, 2):
+            direction = obs.turn_direction(turn)
+            dx, dy = direction.value
+            head = (x + dx, y + dy)
+            if head != avoid and not board.is_blocked(head):
+                yield direction, head
+
+    def closest(self, moves, target):
+        # The move ending nearest target in grid steps, ignoring what's in
+        # between; the first of any tie
+        tx, ty = target
+        return min(moves, key=lambda move: abs(move[1][0] - tx) + abs(move[1][1] - ty), default=None)
+
+class WanderStrategy(ObstacleStrategy):
+    # Move forward, turn if about to hit something, reverse only when boxed in
+    def choose(self, obs, board, field):
+        for move in self.candidates(obs, board):
+            return move
+        dx, dy = obs.direction.value
+        return obs.direction, (obs.body[0][0] + dx, obs.body[0][1] + dy)
+
+class ChaseStrategy(WanderStrategy):
+    # Step towards the player's head
+    def choose(self, obs, board, field):
+        if field is not None:
+            move = self.closest(self.candidates(obs, board), field.player_head)
+            if move:
+                return move
+        return super().choose(obs, board, field)
+
+class GuardStrategy(WanderStrategy):
+    # Patrol within GUARD_RADIUS steps of the food, heading back towards it
+    # when further out, but never sit on the food itself
+    def choose(self, obs, board, field):
+        if field is not None and field.food is not None:
+            moves = list(self.candidates(obs, board, avoid=field.food))
+            for direction, head in moves:
+                if 0 <= field.distance(field.food, head) <= GUARD_RADIUS:
+                    return direction, head
+            move = self.closest(moves, field.food)
+            if move:
+                return move
+        return super().choose(obs, board, field)
+
+OBSTACLE_STRATEGIES = {
+    'wander': WanderStrategy(),
+    'chase': ChaseStrategy(),
+    'guard': GuardStrategy(),
+}
+
+class ObstacleSnake:
+    def __init__(self, body, direction, strategy='wander'):
+        self.body = body  # list of (x, y)
+        self.direction = direction  # Direction enum
+        self.strategy = strategy  # key into OBSTACLE_STRATEGIES
+        self.move_delay = 200
+        self.last_move = 0
+
+    def choose_direction(self, board, field=None):
+        return OBSTACLE_STRATEGIES[self.strategy].choose(self, board, field)
+
+    def move(self, board, field=None):
+        self.direction, head = self.choose_direction(board, field)
+        if not board.in_bounds(head):
+            # Boxed in at the edge: stay put rather than leave the board
+            return
+        self.body.insert(0, head)
+        board.add(Occupancy.OBSTACLE, head)
+        board.remove(Occupancy.OBSTACLE, self.body.pop())
+
+    def turn_direction(self, turn):
+        dirs = [Direction.UP, Direction.RIGHT, Direction.DOWN, Direction.LEFT]
+        idx = dirs.index(self.direction)
+        return dirs[(idx + turn) % 4]
+
+def connect(wall, width, start):
+    # Clears walls (wall is a flat bytearray, changed in place) until every
+    # open cell is reachable from start. One 0-1 BFS from start finds the
+    # way to each cell through the fewest walls (open cells cost nothing),
+    # then each cut-off open cell has the walls on its way cleared, stopping
+    # at the first cell already joined up, so no cell is walked twice.
+    # Returns the indices of the cleared walls.
+    size = len(wall)
+    cost = [size] * size
+    prev = [-1] * size
+    cost[start] = 0
+    queue = deque([start])
+    while queue:
+        i = queue.popleft()
+        c = cost[i]
+        x = i % width
+        for j in (i - width if i >= width else -1, i + width if i + width < size else -1,
+                  i - 1 if x > 0 else -1, i + 1 if x < width - 1 else -1):
+            if j >= 0 and c + wall[j] < cost[j]:
+                cost[j] = c + wall[j]
+                prev[j] = i
+                if wall[j]:
+                    queue.append(j)
+                else:
+                    queue.appendleft(j)
+    joined = bytearray(size)
+    cleared = []
+    for i in range(size):
+        if wall[i] or not cost[i]:
+            continue
+        while cost[i] and not joined[i]:
+            joined[i] = 1
+            if wall[i]:
+                wall[i] = 0
+                cleared.append(i)
+            i = prev[i]
+    return cleared
+
+def spans(lines, size):
+    # (start, end) of the stretches between wall lines across 0..size
+    return zip([0] + [line + 1 for line in lines], lines + [size])
+
+def scatter_walls(wall, width, height, level, rng):
+    # Short wall segments dropped anywhere, more of them each level
+    for _ in range(max(1, width * height * level // 400)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        dx, dy = rng.choice(((1, 0), (0, 1)))
+        for _ in range(rng.randint(1, 3)):
+            if x < width and y < height:
+                wall[y * width + x] = 1
+            x, y = x + dx, y + dy
+
+def room_walls(wall, width, height, level, rng):
+    # Wall lines splitting the board into rooms of about ROOM_SIZE cells a
+    # side, with a door of DOOR_WIDTH cells into each neighbouring room, and
+    # some scatter inside
+    cols, rows = max(2, width // ROOM_SIZE), max(2, height // ROOM_SIZE)
+    xs = [width * i // cols for i in range(1, cols)]
+    ys = [height * i // rows for i in range(1, rows)]
+    for x in xs:
+        wall[x::width] = b'\x01' * height
+    for y in ys:
+        wall[y * width:(y + 1) * width] = b'\x01' * width
+    for x in xs:
+        for start, end in spans(ys, height):
+            door = rng.randrange(start, max(start, end - DOOR_WIDTH) + 1)
+            for y in range(door, min(end, door + DOOR_WIDTH)):
+                wall[y * width + x] = 0
+    for y in ys:
+        for start, end in spans(xs, width):
+            door = rng.randrange(start, max(start, end - DOOR_WIDTH) + 1)
+            for x in range(door, min(end, door + DOOR_WIDTH)):
+                wall[y * width + x] = 0
+    scatter_walls(wall, width, height, level // 2, rng)
+
+def find(parent, i):
+    # Union-find root, halving the path on the way
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def maze_walls(wall, width, height, level, rng):
+    # Kruskal's algorithm over a grid of square rooms: the walls between
+    # neighbouring rooms in random order, each knocked through when
+    # union-find says its rooms aren't joined yet. A few walls that would
+    # close a loop are opened too, so there are fewer dead ends to get
+    # trapped in. Cells past the last full room stay open.
+    step = MAZE_SPACING
+    side = step - 1
+    cols, rows = (width + 1) // step, (height + 1) // step
+    if cols < 2 or rows < 2:
+        scatter_walls(wall, width, height, level, rng)
+        return
+    for i in range(1, cols):
+        x = i * step - 1
+        for y in range(rows * step - 1):
+            wall[y * width + x] = 1
+    for j in range(1, rows):
+        y = j * step - 1
+        wall[y * width:y * width + cols * step - 1] = b'\x01' * (cols * step - 1)
+    edges = []
+    for j in range(rows):
+        for i in range(cols):
+            x, y = i * step, j * step
+            if i + 1 < cols:
+                edges.append((j * cols + i, j * cols + i + 1, [(y + k) * width + x + side for k in range(side)]))
+            if j + 1 < rows:
+                edges.append((j * cols + i, (j + 1) * cols + i, [(y + side) * width + x + k for k in range(side)]))
+    rng.shuffle(edges)
+    parent = list(range(cols * rows))
+    for a, b, cells in edges:
+        a, b = find(parent, a), find(parent, b)
+        if a != b:
+            parent[a] = b
+        elif rng.random() >= MAZE_BRAID:
+            continue
+        for i in cells:
+            wall[i] = 0
+
+LAYOUT_PATTERNS = {
+    'scatter': scatter_walls,
+    'rooms': room_walls,
+    'maze': maze_walls,
+}
+
+class LevelLayout:
+    # Walls of one generated level as one byte per cell of a width x height
+    # area, every open cell reachable from every other. Shared through the
+    # cache, so never modified.
+    def __init__(self, pattern, width, height, cells):
+        self.pattern = pattern
+        self.width = width
+        self.height = height
+        self.cells = bytes(cells)
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE)
+def level_layout(seed, level, width, height, open_x=False, open_y=False):
+    # The same seed, level and size always give the same layout. open_x and
+    # open_y keep the left and right columns or the top and bottom rows free
+    # of walls, for an area with more board around it: the board outside is
+    # then reachable from every open cell inside.
+    rng = random.Random(f"{seed}/{level}/{width}x{height}")
+    pattern = next((name for first, name in LEVEL_PATTERNS if level >= first), None)
+    wall = bytearray(width * height)
+    if pattern:
+        LAYOUT_PATTERNS[pattern](wall, width, height, level, rng)
+        if open_x:
+            wall[::width] = bytes(height)
+            wall[width - 1::width] = bytes(height)
+        if open_y:
+            wall[:width] = bytes(width)
+            wall[-width:] = bytes(width)
+        start = wall.find(0)
+        if start >= 0:
+            connect(wall, width, start)
+    return LevelLayout(pattern, width, height, wall)
+
+class Simulation:
+    # Events emitted by step() and level_up(), drained by the front end:
+    #   ('eat', pos), ('death', pos), ('win',), ('level_up', level),
+    #   ('resize', grid_width, grid_height), ('item', pos, kind),
+    #   ('expire', pos) for special food or an item timing out,
+    #   ('power', kind, pos) on pickup, ('power_end', kind)
+    # board_size=(width, height) plays on a fixed board of that size instead
+    # of one that grows with the level
+    def __init__(self, seed=None, obstacle_ai=OBSTACLE_AI, board_size=None):
+        # Every game gets a concrete seed, which its level layouts derive from
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        self.seed = seed
+        self.obstacle_ai = obstacle_ai
+        self.board_size = board_size
+        self.rng = SimRandom(seed)
+        self.board = Occupancy(GRID_WIDTH, GRID_HEIGHT)
+        self.obstacle_snakes = []
+        self.events = []
+        self.items = {}  # pos -> Item
+        self.timers = TimerQueue()
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # Without a seed the next game takes a fresh one from this game's
+        # random stream, so no two games in a session share their layouts
+        if seed is None:
+            seed = self.rng.getrandbits(32)
+        self.seed = seed
+        self.rng.seed(seed)
+        self.level = 1
+        self.max_level = MAX_LEVEL
+        self.grid_width, self.grid_height = self.board_size or (GRID_WIDTH, GRID_HEIGHT)
+        self.board.resize(self.grid_width, self.grid_height)
+        self.snake = [(self.grid_width // 2, self.grid_height // 2)]
+        self.board.add(Occupancy.SNAKE, self.snake[0])
+        # Cell vacated by the tail on the last move (None if the snake grew),
+        # so renderers can interpolate between ticks
+        self.last_tail = None
+        self.direction = Direction.RIGHT
+        self.next_direction = Direction.RIGHT
+        self.score = 0
+        self.tick = 0
+        self.elapsed = 0
+        self.items.clear()
+        self.timers.clear()
+        self.timers.schedule(ITEM_SPAWN_TICKS, 'spawn')
+        self.food = None
+        self.special_food_timer = 0  # tick the special food expires, 0 if none
+        self.walls = []
+        self.place_food()
+        self.game_over = False
+        self.won = False
+        self.death_cause = None
+        # base_delay is the pace the player has reached; move_delay adds any slowdown
+        self.base_delay = MOVE_DELAY
+        self.move_delay = MOVE_DELAY
+        self.slow_until = 0
+        self.ghost_until = 0
+        self.events.clear()
+        self.obstacle_snakes = []
+        self.spawn_obstacle_snakes()
+
+    def set_direction(self, direction):
+        # Reversing into the neck is ignored, as with the arrow keys
+        if direction != OPPOSITE[self.direction]:
+            self.next_direction = direction
+
+    def drain_events(self):
+        events = self.events
+        self.events = []
+        return events
+
+    def step(self):
+        if self.game_over:
+            return False
+        self.tick += 1
+        for due, _, kind, data in self.timers.pop_due(self.tick):
+            self.fire_timer(due, kind, data)
+        # Obstacle snakes move on simulated time, which advances by the
+        # player's move delay each tick
+        dt = self.move_delay
+        self.elapsed += dt
+        self.move_snake()
+        if self.game_over:
+            return False
+        field = None
+        for obs in self.obstacle_snakes:
+            obs.last_move += dt
+            if obs.last_move > obs.move_delay:
+                if field is None:
+                    field = SpatialField(self.board, self.snake[0], self.food.pos if self.food else None)
+                obs.move(self.board, field)
+                obs.last_move = 0
+        return True
+
+    def move_snake(self):
+        self.direction = self.next_direction
+        dx, dy = self.direction.value
+        head = (self.snake[0][0] + dx, self.snake[0][1] + dy)
+
+        # Check collisions
+        if not self.board.in_bounds(head):
+            self.end_game('bounds')
+            return
+        if self.board.has(Occupancy.WALL, head):
+            self.end_game('wall')
+            return
+        ghost = self.ghost_until > self.tick
+        if self.board.has(Occupancy.SNAKE, head) and not ghost:
+            self.end_game('self')
+            return
+        if self.board.has(Occupancy.OBSTACLE, head) and not ghost:
+            self.end_game('obstacle')
+            return
+
+        self.snake.insert(0, head)
+        self.board.add(Occupancy.SNAKE, head)
+
+        # Check food collision
+        if self.food and head == self.food.pos:
+            self.last_tail = None
+            points = SPECIAL_SCORE if self.food.type == FoodType.SPECIAL else 1
+            self.events.append(('eat', head))
+
+            # Increase speed slightly
+            self.base_delay = max(60, self.base_delay - 2)
+            self.update_delay()
+
+            if not self.place_food():
+                self.score += points
+                self.end_game('win')
+                return
+            self.add_score(points)
+        else:
+            self.last_tail = self.snake.pop()
+            self.board.remove(Occupancy.SNAKE, self.last_tail)
+
+        item = self.items.pop(head, None)
+        if item is not None:
+            self.use_item(item)
+
+    def add_score(self, points):
+        # Level up every 5 points, once for each multiple of 5 passed
+        old = self.score
+        self.score += points
+        for _ in range(self.score // 5 - old // 5):
+            self.level_up()
+
+    def update_delay(self):
+        self.move_delay = self.base_delay + (SLOW_DELAY if self.slow_until > self.tick else 0)
+
+    def use_item(self, item):
+        self.events.append(('power', item.kind, item.pos))
+        if item.kind == 'slow':
+            self.slow_until = self.tick + SLOW_TICKS
+            self.update_delay()
+            self.timers.schedule(self.slow_until, 'power_end', 'slow')
+        elif item.kind == 'ghost':
+            self.ghost_until = self.tick + GHOST_TICKS
+            self.timers.schedule(self.ghost_until, 'power_end', 'ghost')
+        elif item.kind == 'shrink':
+            # The tail now slides in from the last cell cut off, which is
+            # next to the new tail, not from where it was before the shrink
+            for _ in range(min(SHRINK_CELLS, len(self.snake) - 1)):
+                self.last_tail = self.snake.pop()
+                self.board.remove(Occupancy.SNAKE, self.last_tail)
+
+    def fire_timer(self, tick, kind, data):
+        if kind == 'spawn':
+            self.spawn_items()
+            self.timers.schedule(tick + ITEM_SPAWN_TICKS, 'spawn')
+        elif kind == 'expire':
+            # The item may have been picked up, or replaced by a newer one
+            item = self.items.get(data)
+            if item is not None and item.expires == tick:
+                del self.items[data]
+                self.events.append(('expire', data))
+        elif kind == 'special':
+            if (self.food and self.food.type == FoodType.SPECIAL and
+                    self.special_food_timer == tick):
+                self.food = Food(self.food.pos, FoodType.NORMAL)
+                self.special_food_timer = 0
+                self.events.append(('expire', self.food.pos))
+        elif kind == 'power_end':
+            # A later pickup of the same kind extends the power instead
+            until = self.slow_until if data == 'slow' else self.ghost_until
+            if until == tick:
+                self.update_delay()
+                self.events.append(('power_end', data))
+
+    def spawn_items(self):
+        cap = max(1, self.grid_width * self.grid_height // ITEM_CELLS)
+        food = self.food.pos if self.food else None
+        for _ in range(min(-(-cap // 4), cap - len(self.items))):
+            # Items aren't on the occupancy grid: skip a pick that lands on one
+            pos = self.board.random_free_cell(self.rng, food)
+            if pos is None or pos in self.items:
+                continue
+            item = self.items[pos] = Item(pos, self.rng.choice(ITEM_KINDS), self.tick + ITEM_LIFETIME)
+            self.timers.schedule(item.expires, 'expire', pos)
+            self.events.append(('item', pos, item.kind))
+
+    def end_game(self, cause):
+        self.game_over = True
+        self.death_cause = cause
+        if cause == 'win':
+            self.won = True
+            self.events.append(('win',))
+        else:
+            self.events.append(('death', self.snake[0]))
+
+    def place_food(self):
+        pos = self.board.random_free_cell(self.rng)
+        if pos is None:
+            # Board is full: nothing left to eat, the player has won
+            self.food = None
+            return False
+        if pos in self.items:
+            # Food takes the cell over
+            del self.items[pos]
+            self.events.append(('expire', pos))
+        if self.rng.random() < SPECIAL_FOOD_CHANCE:
+            self.food = Food(pos, FoodType.SPECIAL)
+            self.special_food_timer = self.tick + SPECIAL_FOOD_TICKS
+            self.timers.schedule(self.special_food_timer, 'special')
+        else:
+            self.food = Food(pos, FoodType.NORMAL)
+            self.special_food_timer = 0
+        return True
+
+    def spawn_obstacle_snakes(self):
+        for obs in self.obstacle_snakes:
+            for pos in obs.body:
+                self.board.remove(Occupancy.OBSTACLE, pos)
+        self.obstacle_snakes = []
+        if self.level >= 5:
+            for i in range(min((self.level - 4), 3)):
+                # Place obstacle snake at random location
+                pos = self.board.random_free_cell(self.rng)
+                if pos is None:
+                    break
+                direction = self.rng.choice(list(Direction))
+                body = [pos]
+                self.board.add(Occupancy.OBSTACLE, pos)
+                strategy = self.obstacle_ai[i % len(self.obstacle_ai)]
+                self.obstacle_snakes.append(ObstacleSnake(body, direction, strategy))
+
+    def rebuild_board(self):
+        # Cell indices depend on the grid width, so re-index everything after a resize
+        self.board.resize(self.grid_width, self.grid_height)
+        self.board.add_many(Occupancy.SNAKE, self.snake)
+        self.board.add_many(Occupancy.WALL, self.walls)
+        self.board.add_many(Occupancy.OBSTACLE, [pos for obs in self.obstacle_snakes for pos in obs.body])
+
+    def grown_size(self, level, width, height):
+        # Board size after levelling up to level: 2 cells bigger every 3
+        # levels, up to a max
+        if (level % 3 == 0 and not self.board_size and
+                width < MAX_GRID_WIDTH and height < MAX_GRID_HEIGHT):
+            return width + 2, height + 2
+        return width, height
+
+    def layout_area(self, level, width, height):
+        # Cached layout of level for a width x height board: it covers the
+        # whole board up to LAYOUT_WIDTH x LAYOUT_HEIGHT, and that much
+        # around the head on bigger boards
+        area_width, area_height = min(width, LAYOUT_WIDTH), min(height, LAYOUT_HEIGHT)
+        return level_layout(self.seed, level, area_width, area_height,
+                            area_width < width, area_height < height)
+
+    def build_level(self, resized=False):
+        # Walls come from the layout for this seed and level, placed so the
+        # head is as near its middle as the board allows. Cells under the
+        # snake and the food and the one ahead of the head stay open; if that
+        # cuts a pocket off, walls are cleared until every free cell is
+        # reachable from the head again. Items under a wall are buried. Old
+        # walls are swapped for new ones one by one, so this costs as much as
+        # the layout, not the board.
+        layout = self.layout_area(self.level, self.grid_width, self.grid_height)
+        width, height = layout.width, layout.height
+        head = self.snake[0]
+        ox = min(max(0, head[0] - width // 2), self.grid_width - width)
+        oy = min(max(0, head[1] - height // 2), self.grid_height - height)
+        wall = bytearray(layout.cells)
+        dx, dy = self.direction.value
+        keep = self.snake + [(head[0] + dx, head[1] + dy)] + ([self.food.pos] if self.food else [])
+        kept = False
+        for x, y in keep:
+            x, y = x - ox, y - oy
+            if 0 <= x < width and 0 <= y < height and wall[y * width + x]:
+                wall[y * width + x] = 0
+                kept = True
+        if kept:
+            connect(wall, width, (head[1] - oy) * width + head[0] - ox)
+        board = self.board
+        old = self.walls
+        self.walls = [(ox + i % width, oy + i // width) for i in range(len(wall)) if wall[i]]
+        if resized:
+            self.rebuild_board()
+        else:
+            for pos in old:
+                board.remove(Occupancy.WALL, pos)
+            for pos in self.walls:
+                board.add(Occupancy.WALL, pos)
+        for pos in self.walls:
+            self.items.pop(pos, None)
+
+    def prefetch_levels(self):
+        # Generator that builds the layout of each level this game can reach,
+        # one per step, so that level ups find it cached
+        width, height = self.board_size or (GRID_WIDTH, GRID_HEIGHT)
+        for level in range(2, self.max_level + 1):
+            width, height = self.grown_size(level, width, height)
+            self.layout_area(level, width, height)
+            yield
+
+    def level_up(self):
+        if self.level < self.max_level:
+            self.level += 1
+            self.events.append(('level_up', self.level))
+            size = self.grown_size(self.level, self.grid_width, self.grid_height)
+            resized = size != (self.grid_width, self.grid_height)
+            self.grid_width, self.grid_height = size
+            # Swap in the new walls (and the bigger board, if it grew)
+            self.build_level(resized)
+            if resized:
+                self.events.append(('resize', self.grid_width, self.grid_height))
+            # Increase speed
+            self.base_delay = max(40, self.base_delay - 8)
+            self.update_delay()
+            # Add more obstacle snakes
+            self.spawn_obstacle_snakes()
+
+class TickScheduler:
+    # Fixed-timestep driver: real (or simulated) milliseconds accumulate and
+    # are spent in whole ticks of the current move delay, keeping the remainder
+    # so the tick rate never drifts with the frame rate. After a stall, at most
+    # max_catch_up ticks run per advance() and the rest of the backlog is dropped.
+    def __init__(self, max_catch_up=5):
+        self.max_catch_up = max_catch_up
+        self.accumulator = 0
+
+    def reset(self):
+        self.accumulator = 0
+
+    def advance(self, sim, dt, step=None):
+        # step replaces sim.step, e.g. to record or replay inputs around each tick
+        step = step or sim.step
+        self.accumulator += dt
+        ticks = 0
+        while self.accumulator >= sim.move_delay and not sim.game_over:
+            if ticks == self.max_catch_up:
+                self.accumulator %= sim.move_delay
+                break
+            self.accumulator -= sim.move_delay
+            step()
+            ticks += 1
+        return ticks
+
+    def alpha(self, sim):
+        # Fraction of the way to the next tick, for render interpolation
+        return min(1.0, self.accumulator / sim.move_delay)
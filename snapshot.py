@@ -0,0 +1,356 @@
+import struct
+from collections import deque
+from itertools import accumulate, chain
+
+from simulation import (Direction, Food, FoodType, Item, ITEM_KINDS, ObstacleSnake, Occupancy,
+                        OBSTACLE_STRATEGIES, Simulation, SimRandom, TimerQueue)
+
+
+# Complete simulation state as a compact bit-packed blob, for save/resume,
+# rewinding and forking a game into many rollouts. Pending events are not
+# part of the state and come back empty.
+#
+# Layout: one VERSION byte, then a little-endian bit stream. Counters are
+# varints of 7-bit groups, board cells are indices of just enough bits for
+# the grid, and each snake body is its head cell followed by 2 bits per
+# segment giving the step to the next one. A 1000-cell snake is ~250 bytes;
+# an early game fits in ~30. Pending timers are stored in firing order with
+# their ticks relative to the current one.
+
+VERSION = 2
+SAVE_PATH = 'snake_save.bin'
+REWIND_BYTES = 1 << 20
+REWIND_KEYFRAME = 16  # ticks per rewind snapshot; the ones between are replayed
+
+DIRECTIONS = list(Direction)
+DIRECTION_CODES = {direction: i for i, direction in enumerate(DIRECTIONS)}
+STEP_CODES = {direction.value: i for i, direction in enumerate(DIRECTIONS)}
+FOOD_TYPES = list(FoodType)
+STRATEGIES = list(OBSTACLE_STRATEGIES)
+CAUSES = (None, 'bounds', 'wall', 'self', 'obstacle', 'win')
+TIMER_KINDS = ('spawn', 'expire', 'special', 'power_end')
+# The four 2-bit step codes packed in each byte of a body, lowest bits first
+UNPACK = [tuple((byte >> shift) & 3 for shift in (0, 2, 4, 6)) for byte in range(256)]
+
+
+class BitWriter:
+    def __init__(self):
+        self.out = bytearray([VERSION])
+        self.acc = 0
+        self.nbits = 0
+
+    def bits(self, value, n):
+        self.acc |= value << self.nbits
+        self.nbits += n
+        if self.nbits >= 8:
+            whole = self.nbits >> 3
+            self.out += (self.acc & ((1 << (whole << 3)) - 1)).to_bytes(whole, 'little')
+            self.acc >>= whole << 3
+            self.nbits &= 7
+
+    def flag(self, value):
+        self.bits(1 if value else 0, 1)
+
+    def varint(self, value):
+        while value > 0x7f:
+            self.bits((value & 0x7f) | 0x80, 8)
+            value >>= 7
+        self.bits(value, 8)
+
+    def getvalue(self):
+        if self.nbits:
+            self.out.append(self.acc)
+        return bytes(self.out)
+
+
+class BitReader:
+    def __init__(self, data):
+        if not data or data[0] != VERSION:
+            raise ValueError("not a snapshot of this version")
+        self.data = data
+        self.pos = 1
+        self.acc = 0
+        self.nbits = 0
+
+    def bits(self, n):
+        if self.nbits < n:
+            whole = (n - self.nbits + 7) >> 3
+            if self.pos + whole > len(self.data):
+                raise ValueError("truncated snapshot")
+            self.acc |= int.from_bytes(self.data[self.pos:self.pos + whole], 'little') << self.nbits
+            self.pos += whole
+            self.nbits += whole << 3
+        value = self.acc & ((1 << n) - 1)
+        self.acc >>= n
+        self.nbits -= n
+        return value
+
+    def flag(self):
+        return self.bits(1) == 1
+
+    def varint(self):
+        result = 0
+        shift = 0
+        while True:
+            byte = self.bits(8)
+            result |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+
+def write_body(out, body, width, cell_bits):
+    out.varint(len(body))
+    x, y = body[0]
+    out.bits(y * width + x, cell_bits)
+    codes = [STEP_CODES[(b[0] - a[0], b[1] - a[1])] for a, b in zip(body, body[1:])]
+    codes += [0] * (-len(codes) % 4)
+    steps = iter(codes)
+    packed = bytes(a | b << 2 | c << 4 | d << 6 for a, b, c, d in zip(steps, steps, steps, steps))
+    out.bits(int.from_bytes(packed, 'little'), 2 * (len(body) - 1))
+
+
+def read_body(src, width, cell_bits):
+    n = src.varint()
+    start = src.bits(cell_bits)
+    packed = src.bits(2 * (n - 1)).to_bytes((n + 2) // 4, 'little')
+    # Steps become cell index offsets, so one accumulate walks the body
+    offsets = [dy * width + dx for dx, dy in (direction.value for direction in DIRECTIONS)]
+    steps = [offsets[code] for code in chain.from_iterable(UNPACK[byte] for byte in packed)]
+    return [(i % width, i // width) for i in accumulate(steps[:n - 1], initial=start)]
+
+
+def snapshot(sim):
+    out = BitWriter()
+    width = sim.grid_width
+    cell_bits = max(1, (width * sim.grid_height - 1).bit_length())
+
+    # Seeds are zigzag encoded, like in replays
+    out.flag(sim.seed is not None)
+    if sim.seed is not None:
+        out.varint(sim.seed * 2 if sim.seed >= 0 else -sim.seed * 2 - 1)
+    out.flag(sim.board_size is not None)
+    out.varint(width)
+    out.varint(sim.grid_height)
+    out.varint(len(sim.obstacle_ai))
+    for name in sim.obstacle_ai:
+        out.bits(STRATEGIES.index(name), 2)
+
+    for value in (sim.level, sim.max_level, sim.move_delay, sim.base_delay, sim.score, sim.tick,
+                  sim.elapsed, sim.special_food_timer, sim.slow_until, sim.ghost_until):
+        out.varint(value)
+    out.flag(sim.game_over)
+    out.flag(sim.won)
+    out.bits(CAUSES.index(sim.death_cause), 3)
+    out.bits(DIRECTION_CODES[sim.direction], 2)
+    out.bits(DIRECTION_CODES[sim.next_direction], 2)
+
+    state, gauss_next = sim.rng.getstate()
+    out.bits(state, 64)
+    out.flag(gauss_next is not None)
+    if gauss_next is not None:
+        out.bits(struct.unpack('<Q', struct.pack('<d', gauss_next))[0], 64)
+
+    write_body(out, sim.snake, width, cell_bits)
+    out.flag(sim.last_tail is not None)
+    if sim.last_tail is not None:
+        out.bits(sim.last_tail[1] * width + sim.last_tail[0], cell_bits)
+    out.flag(sim.food is not None)
+    if sim.food is not None:
+        out.bits(sim.food.pos[1] * width + sim.food.pos[0], cell_bits)
+        out.bits(FOOD_TYPES.index(sim.food.type), 1)
+
+    out.varint(len(sim.walls))
+    for x, y in sim.walls:
+        out.bits(y * width + x, cell_bits)
+
+    out.varint(len(sim.obstacle_snakes))
+    for obs in sim.obstacle_snakes:
+        out.bits(STRATEGIES.index(obs.strategy), 2)
+        out.bits(DIRECTION_CODES[obs.direction], 2)
+        out.varint(obs.move_delay)
+        out.varint(obs.last_move)
+        write_body(out, obs.body, width, cell_bits)
+
+    out.varint(len(sim.items))
+    for item in sim.items.values():
+        out.bits(item.pos[1] * width + item.pos[0], cell_bits)
+        out.bits(ITEM_KINDS.index(item.kind), 2)
+        out.varint(item.expires - sim.tick)
+
+    # (tick, seq) pairs are unique, so sorting never compares the payloads
+    out.varint(len(sim.timers))
+    for tick, _, kind, data in sorted(sim.timers.heap):
+        out.varint(tick - sim.tick)
+        out.bits(TIMER_KINDS.index(kind), 2)
+        if kind == 'expire':
+            out.bits(data[1] * width + data[0], cell_bits)
+        elif kind == 'power_end':
+            out.bits(ITEM_KINDS.index(data), 2)
+    return out.getvalue()
+
+
+def restore(data, sim=None):
+    # Loads the state into sim (a new Simulation if None) and returns it.
+    # Raises ValueError if data isn't a snapshot of this version.
+    src = BitReader(data)
+    if sim is None:
+        # Skip __init__: its reset() would place food and spawn obstacles
+        # only for all of it to be overwritten
+        sim = Simulation.__new__(Simulation)
+        sim.rng = SimRandom(0)
+        sim.board = Occupancy(1, 1)
+        sim.items = {}
+        sim.timers = TimerQueue()
+    sim.events = []
+
+    sim.seed = None
+    if src.flag():
+        seed = src.varint()
+        sim.seed = seed // 2 if seed % 2 == 0 else -(seed + 1) // 2
+    fixed = src.flag()
+    width = sim.grid_width = src.varint()
+    height = sim.grid_height = src.varint()
+    sim.board_size = (width, height) if fixed else None
+    sim.obstacle_ai = tuple(STRATEGIES[src.bits(2)] for _ in range(src.varint()))
+    cell_bits = max(1, (width * height - 1).bit_length())
+
+    sim.level = src.varint()
+    sim.max_level = src.varint()
+    sim.move_delay = src.varint()
+    sim.base_delay = src.varint()
+    sim.score = src.varint()
+    sim.tick = src.varint()
+    sim.elapsed = src.varint()
+    sim.special_food_timer = src.varint()
+    sim.slow_until = src.varint()
+    sim.ghost_until = src.varint()
+    sim.game_over = src.flag()
+    sim.won = src.flag()
+    sim.death_cause = CAUSES[src.bits(3)]
+    sim.direction = DIRECTIONS[src.bits(2)]
+    sim.next_direction = DIRECTIONS[src.bits(2)]
+
+    state = src.bits(64)
+    gauss_next = None
+    if src.flag():
+        gauss_next = struct.unpack('<d', struct.pack('<Q', src.bits(64)))[0]
+    sim.rng.setstate((state, gauss_next))
+
+    sim.snake = read_body(src, width, cell_bits)
+    sim.last_tail = None
+    if src.flag():
+        i = src.bits(cell_bits)
+        sim.last_tail = (i % width, i // width)
+    sim.food = None
+    if src.flag():
+        i = src.bits(cell_bits)
+        sim.food = Food((i % width, i // width), FOOD_TYPES[src.bits(1)])
+
+    sim.walls = []
+    for _ in range(src.varint()):
+        i = src.bits(cell_bits)
+        sim.walls.append((i % width, i // width))
+
+    sim.obstacle_snakes = []
+    for _ in range(src.varint()):
+        strategy = STRATEGIES[src.bits(2)]
+        direction = DIRECTIONS[src.bits(2)]
+        obs = ObstacleSnake(None, direction, strategy)
+        obs.move_delay = src.varint()
+        obs.last_move = src.varint()
+        obs.body = read_body(src, width, cell_bits)
+        sim.obstacle_snakes.append(obs)
+
+    sim.items.clear()
+    for _ in range(src.varint()):
+        i = src.bits(cell_bits)
+        pos = (i % width, i // width)
+        kind = ITEM_KINDS[src.bits(2)]
+        sim.items[pos] = Item(pos, kind, sim.tick + src.varint())
+
+    # Written in firing order, so the list is already a valid heap
+    heap = []
+    for seq in range(src.varint()):
+        tick = sim.tick + src.varint()
+        kind = TIMER_KINDS[src.bits(2)]
+        data = None
+        if kind == 'expire':
+            i = src.bits(cell_bits)
+            data = (i % width, i // width)
+        elif kind == 'power_end':
+            data = ITEM_KINDS[src.bits(2)]
+        heap.append((tick, seq, kind, data))
+    sim.timers.heap = heap
+    sim.timers.seq = len(heap)
+
+    sim.rebuild_board()
+    return sim
+
+
+def fork(sim, n):
+    # n independent copies of sim, e.g. as starting points for rollouts
+    data = snapshot(sim)
+    return [restore(data) for _ in range(n)]
+
+
+def save(sim, path=SAVE_PATH):
+    with open(path, 'wb') as f:
+        f.write(snapshot(sim))
+
+
+def load(path=SAVE_PATH):
+    with open(path, 'rb') as f:
+        return restore(f.read())
+
+
+class RewindBuffer:
+    # Recent ticks for rewinding: a snapshot every REWIND_KEYFRAME ticks and
+    # the direction applied on each tick after it, so going back restores
+    # the nearest snapshot and replays the ticks up to where it stops. Oldest
+    # keyframes are dropped once their snapshots take up more than max_bytes
+    # in total.
+    def __init__(self, max_bytes=REWIND_BYTES):
+        self.max_bytes = max_bytes
+        self.keyframes = deque()  # (tick, snapshot, direction codes since)
+        self.size = 0
+
+    def __len__(self):
+        return sum(1 + len(codes) for _, _, codes in self.keyframes)
+
+    def clear(self):
+        self.keyframes.clear()
+        self.size = 0
+
+    def push(self, sim):
+        # Call with the starting state and after every tick
+        if self.keyframes:
+            tick, _, codes = self.keyframes[-1]
+            if sim.tick == tick + len(codes):
+                return
+            if sim.tick == tick + len(codes) + 1 and len(codes) < REWIND_KEYFRAME - 1:
+                codes.append(DIRECTION_CODES[sim.direction])
+                return
+        data = snapshot(sim)
+        self.keyframes.append((sim.tick, data, []))
+        self.size += len(data)
+        while self.size > self.max_bytes and len(self.keyframes) > 1:
+            self.size -= len(self.keyframes.popleft()[1])
+
+    def rewind(self, ticks, sim=None):
+        # Goes back `ticks` ticks (to the oldest kept, if there aren't that
+        # many) and returns the simulation there; None when empty
+        if not self.keyframes:
+            return None
+        tick, _, codes = self.keyframes[-1]
+        target = max(tick + len(codes) - ticks, self.keyframes[0][0])
+        while self.keyframes[-1][0] > target:
+            self.size -= len(self.keyframes.pop()[1])
+        tick, data, codes = self.keyframes[-1]
+        del codes[target - tick:]
+        sim = restore(data, sim)
+        for code in codes:
+            sim.next_direction = DIRECTIONS[code]
+            sim.step()
+        sim.events.clear()
+        return sim